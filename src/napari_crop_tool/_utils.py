@@ -1,5 +1,10 @@
+import hashlib
+import re
+
+import numpy as np
 from napari.layers import Layer
 
+
 def _get_scale_from_layer(
     layer: Layer
 ) -> tuple:
@@ -20,3 +25,82 @@ def _get_scale_from_layer(
         return tuple([1.0] * data_ndim)
 
     return tuple(float(s) for s in scale)
+
+
+def _get_layer_key(
+    layer: Layer
+) -> str:
+    """Returns a stable, filename-safe key identifying a layer's data.
+
+    The key combines the layer name, its source path and its data shape, so the
+    same image reopened in a later napari session maps to the same key.
+
+    Parameters:
+        layer (Layer): The napari layer instance.
+
+    Returns:
+        str: The layer key.
+    """
+    source = getattr(layer, "source", None)
+    path = getattr(source, "path", None) or ""
+    shapes = getattr(layer, "level_shapes", None)
+    shape = tuple(int(s) for s in shapes[0]) if shapes is not None and len(shapes) \
+            else tuple(getattr(layer.data, "shape", ()))
+    digest = hashlib.sha1(f"{layer.name}|{path}|{shape}".encode()).hexdigest()[:12]
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", layer.name)[:40]
+    return f"{safe_name}_{digest}"
+
+
+def _get_axis_names(
+    axis_labels: tuple,
+    ndim: int
+) -> tuple:
+    """Returns lower-case axis names for a layer of dimensionality `ndim`.
+
+    Explicit viewer axis labels are used when set; napari's default numeric labels
+    fall back to the trailing axes of (t, c, z, y, x), with 4D taken as (t, z, y, x).
+
+    Parameters:
+        axis_labels (tuple): The viewer axis labels (`viewer.dims.axis_labels`).
+        ndim (int): The layer dimensionality.
+
+    Returns:
+        tuple: One axis name per layer axis.
+    """
+    labels = tuple(str(a).strip().lower() for a in axis_labels[-ndim:])
+    if (len(labels) == ndim and all(labels) and len(set(labels)) == ndim
+            and not any(a.lstrip("-").isdigit() for a in labels)):
+        return labels
+    if ndim == 4:
+        return ("t", "z", "y", "x")
+    if ndim <= 5:
+        return ("t", "c", "z", "y", "x")[-ndim:]
+    return (*(f"a{i}" for i in range(ndim - 3)), "z", "y", "x")
+
+
+def _get_roi_properties(
+    ndim: int,
+    axis_names: tuple
+) -> dict:
+    """Returns the empty per-ROI properties of a cropping Shapes layer.
+
+    3D+ ROIs track a scroll axis with a start/end position; every leading (t, c, ...)
+    axis of 4D/5D data gets a start/end range of its own.
+
+    Parameters:
+        ndim (int): The layer dimensionality.
+        axis_names (tuple): The layer axis names (see `_get_axis_names`).
+
+    Returns:
+        dict: Property name -> empty array.
+    """
+    if ndim <= 2:
+        return {"id": np.array([], dtype=str)}
+    props = {"track_axis": np.array([], dtype=int),
+             "start_idx": np.array([], dtype=float),
+             "end_idx": np.array([], dtype=float),
+             "id": np.array([], dtype=str)}
+    for name in axis_names[:max(ndim - 3, 0)]:
+        props[f"start_{name}"] = np.array([], dtype=float)
+        props[f"end_{name}"] = np.array([], dtype=float)
+    return props
@@ -0,0 +1,159 @@
+# cropping/compression.py
+"""Output codecs and the auto mode that picks a codec and chunk shape per ROI."""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+AUTO = "auto"
+
+CODECS = ("blosc-lz4", "zstd", "none")
+TARGETS = ("throughput", "size")
+DEFAULT_CODEC = "blosc-lz4"
+DEFAULT_LEVEL = 5
+
+# levels tried in auto mode
+_AUTO_CANDIDATES = (
+    ("none", 0),
+    ("blosc-lz4", 1), ("blosc-lz4", 5), ("blosc-lz4", 9),
+    ("zstd", 1), ("zstd", 3), ("zstd", 9),
+)
+
+
+def make_compressor(codec: str, level: int = DEFAULT_LEVEL):
+    """Numcodecs compressor for `codec`, or None for uncompressed output."""
+    if codec == "none":
+        return None
+    import numcodecs
+
+    if codec == "blosc-lz4":
+        return numcodecs.Blosc(cname="lz4", clevel=int(level),
+                               shuffle=numcodecs.Blosc.SHUFFLE)
+    if codec == "zstd":
+        return numcodecs.Zstd(level=int(level))
+    raise ValueError(f"Unknown codec '{codec}'.")
+
+
+def chunk_candidates(shape: tuple[int, ...]) -> list[tuple[int, ...]]:
+    """Chunk shapes tried in auto mode.
+
+    One index along leading axes, a few z / y-x block sizes along the spatial
+    ones.
+    """
+    n_leading = max(len(shape) - 3, 0)
+    n_spatial = len(shape) - n_leading
+    zs = (16, 32, 64) if n_spatial == 3 else (None,)
+    candidates = []
+    for z in zs:
+        for yx in (128, 256, 512):
+            spatial = ((z,) if z is not None else ()) + (yx, yx)
+            chunks = (1,) * n_leading + tuple(
+                max(min(c, s), 1)
+                for c, s in zip(spatial, shape[n_leading:], strict=True))
+            if chunks not in candidates:
+                candidates.append(chunks)
+    return candidates
+
+
+@dataclass
+class CodecChoice:
+    """Codec and chunk shape picked for one ROI, with what was measured."""
+    codec: str
+    level: int
+    chunks: tuple[int, ...] | None = None
+    measurements: list[dict] | None = field(default_factory=list)
+
+    def as_metadata(self) -> dict:
+        """JSON-serialisable form stored in the export manifest."""
+        return {"codec": self.codec, "level": self.level,
+                "chunks": list(self.chunks) if self.chunks else None,
+                "measurements": self.measurements}
+
+
+def _measure(codec: str, level: int, blocks: list[np.ndarray]) -> dict:
+    compressor = make_compressor(codec, level)
+    raw = stored = 0
+    start = time.perf_counter()
+    for block in blocks:
+        buf = np.ascontiguousarray(block)
+        raw += buf.nbytes
+        stored += buf.nbytes if compressor is None else len(compressor.encode(buf))
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    return {"codec": codec, "level": level, "raw_bytes": raw,
+            "stored_bytes": stored, "encode_mb_s": raw / elapsed / 1e6,
+            "ratio": stored / max(raw, 1), "n_chunks": len(blocks)}
+
+
+def _seconds_per_mb(m: dict, disk_mb_s: float, chunk_overhead_s: float) -> float:
+    """Estimated write time of one raw MB: encode + store + per-chunk cost."""
+    chunks_per_mb = m["n_chunks"] / max(m["raw_bytes"] / 1e6, 1e-9)
+    return (1 / max(m["encode_mb_s"], 1e-9) + m["ratio"] / disk_mb_s
+            + chunk_overhead_s * chunks_per_mb)
+
+
+def _score(m: dict, target: str, disk_mb_s: float, chunk_overhead_s: float):
+    secs = _seconds_per_mb(m, disk_mb_s, chunk_overhead_s)
+    m["est_write_mb_s"] = 1 / secs
+    return (m["ratio"], secs) if target == "size" else (secs, m["ratio"])
+
+
+def tune_codec(
+    shape: tuple[int, ...],
+    read: Callable[[tuple[slice, ...]], np.ndarray],
+    target: str = "throughput",
+    n_samples: int = 2,
+    disk_mb_s: float = 200.0,
+    chunk_overhead_s: float = 1e-3,
+) -> CodecChoice:
+    """Pick a codec/level and chunk shape for an output of `shape`.
+
+    A few regions of the ROI, as large as the biggest candidate chunk, are read
+    through `read` and encoded: first every codec at the median chunk shape,
+    then the winning codec at every chunk shape. `target` "throughput" favours
+    the highest estimated write MB/s (encode speed, bytes to disk at
+    `disk_mb_s`, `chunk_overhead_s` per chunk), "size" the fewest bytes.
+    """
+    if target not in TARGETS:
+        raise ValueError(f"Unknown tuning target '{target}'.")
+    candidates = chunk_candidates(shape)
+    extent = np.max(np.array(candidates), axis=0)
+    starts = np.unique(np.linspace(0, shape[0] - extent[0], n_samples).astype(int))
+    samples = []
+    for first in starts:
+        region = (
+            slice(int(first), int(first) + int(extent[0])),
+            *(slice((s - e) // 2, (s - e) // 2 + e)
+              for s, e in zip(shape[1:], extent[1:], strict=True)),
+        )
+        samples.append(read(region))
+
+    def chunk_blocks(chunks):
+        return [s[tuple(slice(0, c) for c in chunks)] for s in samples]
+
+    base_chunks = candidates[len(candidates) // 2]
+    measured = [_measure(c, lvl, chunk_blocks(base_chunks))
+                for c, lvl in _AUTO_CANDIDATES]
+    best = min(measured,
+               key=lambda m: _score(m, target, disk_mb_s, chunk_overhead_s))
+
+    by_chunks = []
+    for chunks in candidates:
+        m = _measure(best["codec"], best["level"], chunk_blocks(chunks))
+        m["chunks"] = list(chunks)
+        by_chunks.append(m)
+    best_chunks = min(by_chunks,
+                      key=lambda m: _score(m, target, disk_mb_s, chunk_overhead_s))
+
+    return CodecChoice(
+        codec=best["codec"],
+        level=best["level"],
+        chunks=tuple(best_chunks["chunks"]),
+        measurements=[{"stage": "codec", **m} for m in measured]
+        + [{"stage": "chunks", **m} for m in by_chunks],
+    )
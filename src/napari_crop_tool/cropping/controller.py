@@ -1,30 +1,48 @@
 # cropping/controller.py
 from __future__ import annotations
-from pathlib import Path
 from contextlib import contextmanager
+import threading
+from typing import TYPE_CHECKING
+import numpy as np
 from qtpy.QtWidgets import QMessageBox
 
+from .export import CropExport, ExportCancelled
 from .model import CroppingModel
 from .gui import CroppingGUIQt
+from .storage import path_exists, path_name, path_suffix
 
+from napari.qt.threading import create_worker
 from napari.utils.notifications import (
     show_info,
     show_warning
 )
 
+if TYPE_CHECKING:
+    from .journal import RoiJournal
+    from .trace import TraceRecorder
+
 class CroppingController:
     """Wiring (events + callbacks) for ROI cropping."""
     def __init__(
         self, 
         model: CroppingModel, 
         gui: CroppingGUIQt,
+        journal: RoiJournal | None = None,
+        recorder: TraceRecorder | None = None,
     ):
         self.model = model
         self.gui = gui
+        self.journal = journal
+        self.recorder = recorder
         self.selected_roi_idx: int | None = None
         self._restoring_selection = False
         self._suspend_roi_sync = False
         self._prev_num_rois = self.model.num_rois()
+        # ROIs edited since the last autosave (None: all), and ROIs deleted
+        self._journal_changed: set[int] | None = None
+        self._journal_removed: list[int] = []
+        self._export_worker = None
+        self._export_cancel = threading.Event()
 
         # Wire napari + gui events
         self.model.shapes_layer.events.data.connect(self._on_shapes_data_changed)
@@ -36,7 +54,13 @@ class CroppingController:
         self.gui.roi_selected.connect(self.on_roi_selected_from_list)
         self.gui.delete_selected_clicked.connect(self.on_delete_selected)
         self.gui.set_rectangle_size_clicked.connect(self.on_set_rectangle_size)
+        self.gui.set_range_start_clicked.connect(self.on_set_range_start)
+        self.gui.set_range_stop_clicked.connect(self.on_set_range_stop)
+        self.gui.cancel_export_clicked.connect(self.cancel_export)
         self.model.shapes_layer.events.highlight.connect(self._on_shapes_highlight_changed)
+        self.model.viewer.camera.events.zoom.connect(self._on_zoom_changed)
+        if self.recorder is not None:
+            self.model.viewer.dims.events.current_step.connect(self._trace_dims)
 
         # Initial paint
         self.update_rois()
@@ -50,24 +74,78 @@ class CroppingController:
         finally:
             self._suspend_roi_sync = old
 
-    def _on_shapes_data_changed(self, *args):
+    def _on_shapes_data_changed(self, event=None):
         if self._suspend_roi_sync:
             return
+        if self.recorder is not None and event is not None:
+            self.recorder.record_shapes(self.model.shapes_layer, event,
+                                        self._prev_num_rois)
+        if event is not None:
+            action = str(getattr(event.action, "value", event.action))
+            if action == "changed":
+                self._mark_changed(event.data_indices)
+            elif action == "removed":
+                self._mark_removed(event.data_indices)
         self.update_rois()
 
+    def _mark_changed(self, indices=None):
+        if indices is None or self._journal_changed is None:
+            self._journal_changed = None
+        else:
+            self._journal_changed.update(int(i) for i in indices)
+
+    def _mark_removed(self, indices):
+        if self._journal_changed:
+            # pending indices refer to the layout before the deletion
+            self._journal_changed = None
+        self._journal_removed.extend(int(i) for i in indices)
+
+    def _trace(self, kind: str, name: str, **args):
+        if self.recorder is not None:
+            if kind == "action" and self.selected_roi_idx is not None:
+                # the ROI the action applies to, so replay does not depend on
+                # how the selection moved in between
+                args.setdefault("sel", int(self.selected_roi_idx))
+            self.recorder.record(kind, name, **args)
+
+    def _trace_dims(self, event=None):
+        self._trace("dims", "step",
+                    step=[int(s) for s in self.model.viewer.dims.current_step])
+
     def _project_shapes(self):
-        curr_shapes_data = self.model.shapes_layer.data
-        n = self.model.num_rois()
-        curr_axis = self.model.viewer.dims.order[0]
-        for i in range(n):
-            scroll_roi_axis = self.model.get_track_axis(i)
-            if curr_axis == scroll_roi_axis:
-                slice_idx = self.model.viewer.dims.current_step[curr_axis]
-                curr_shapes_data[i][:,curr_axis] = slice_idx    
-        with self._suspend_sync():    
-            self.model.shapes_layer.data = curr_shapes_data
+        layer = self.model.shapes_layer
+        curr_axis = self.model.get_scroll_axis()
+        positions = self.model.slice_positions(self.selected_roi_idx)
+        if positions.shape[1] != layer.ndim:
+            # the viewer dims changed under the layer (e.g. layers removed)
+            return
+        # keep ROIs visible while scrolling through time / channels: every
+        # vertex follows the ROI's slice position on its range axes and, if
+        # the ROI tracks the scroll axis, on that axis too
+        data = layer.data
+        axes = np.zeros(positions.shape, dtype=bool)
+        axes[:, list(self.model.range_axes)] = True
+        axes[:, curr_axis] |= self.model.get_track_axes() == curr_axis
+        moved = {}
+        if data and axes.any():
+            owner = np.repeat(np.arange(len(data)), [len(roi) for roi in data])
+            off = axes[owner] & (np.concatenate(data) != positions[owner])
+            for i in np.unique(owner[off.any(axis=1)]):
+                roi = data[i].copy()
+                roi[:, axes[i]] = positions[i, axes[i]]
+                moved[int(i)] = roi
+        if moved:
+            with self._suspend_sync():
+                self.model.move_rois(moved)
+            self._mark_changed(moved)
+            self._autosave()
         self._apply_selected_roi()
-        self.model.shapes_layer.refresh()
+        self.model.update_level_of_detail(
+            self.model.visible_roi_mask(self.selected_roi_idx))
+        layer.refresh()
+
+    def _on_zoom_changed(self, event=None):
+        self.model.update_level_of_detail()
 
     def _apply_selected_roi(self):
         if self._restoring_selection:
@@ -102,6 +180,8 @@ class CroppingController:
         # user clicked a ROI on the canvas
         if len(sel) == 1:
             idx = next(iter(sel))
+            if idx != self.selected_roi_idx:
+                self._trace("select", "select", idx=int(idx))
             self.selected_roi_idx = idx
             self.gui.set_selected_roi_row(idx)
             return
@@ -112,13 +192,12 @@ class CroppingController:
 
     def update_rois(self, *args):
         n = self.model.num_rois()
-        scroll_axis = self.model.viewer.dims.order[0]
+        scroll_axis = self.model.get_scroll_axis()
 
-        props = dict(self.model.shapes_layer.properties)
-        if (self.gui.roi_list.count()) < n:
-            n_new_rois = n - (self.gui.roi_list.count())
-            scroll_axis = self.model.viewer.dims.order[0]
+        if self._prev_num_rois < n:
+            self._mark_changed(range(self._prev_num_rois, n))
             props = dict(self.model.shapes_layer.properties)
+            n_new_rois = n - self._prev_num_rois
             track_axis = props["track_axis"].copy()
             start_idx = props["start_idx"].copy()
             end_idx = props["end_idx"].copy()
@@ -134,20 +213,37 @@ class CroppingController:
             props["start_idx"] = start_idx
             props["end_idx"] = end_idx
 
+            for axis in self.model.range_axes:
+                for key, default in zip(self.model.range_keys(axis),
+                                        (self.model.min_um, self.model.max_um),
+                                        strict=True):
+                    values = props[key].copy()
+                    values[-n_new_rois:] = default[axis]
+                    props[key] = values
+
             self.model.shapes_layer.properties = props
 
         self.model.sync_properties()
 
-        idx_to_axis = {0: "Z", 1: "Y", 2: "X"}
+        # one read per column; per-ROI getters would each go through the layer
+        track_axes = self.model.get_track_axes()
+        scroll = self.model.get_scroll_ranges_um()
+        ranges = {axis: self.model.get_axis_ranges_um(axis)
+                  for axis in self.model.range_axes}
         roi_list = []
         for i in range(n):
-            curr_axis = self.model.get_track_axis(i)
-            axis = idx_to_axis[curr_axis]
-            roi_list.append(
+            axis = self.model.axis_names[track_axes[i]].upper()
+            label = (
                 f"ROI {i:02}: "
-                f"{axis} start={self.model.get_scroll_start_um(i):.2f}, "
-                f"{axis} end={self.model.get_scroll_end_um(i):.2f}"
+                f"{axis} start={scroll[i, 0]:.2f}, "
+                f"{axis} end={scroll[i, 1]:.2f}"
             )
+            for range_axis, values in ranges.items():
+                label += (
+                    f", {self.model.axis_names[range_axis].upper()}="
+                    f"[{values[i, 0]:.2f}, {values[i, 1]:.2f}]"
+                )
+            roi_list.append(label)
         self.gui.set_roi_labels(roi_list)
 
         # if a new ROI was just created, select the newest one
@@ -160,30 +256,78 @@ class CroppingController:
 
         self._prev_num_rois = n
         self._apply_selected_roi()
+        self.model.update_level_of_detail(
+            self.model.visible_roi_mask(self.selected_roi_idx))
+        self._autosave()
+
+    def _autosave(self):
+        if self.journal is None:
+            return
+        layer = self.model.shapes_layer
+        self.journal.record(layer.data, layer.shape_type, layer.features,
+                            changed=self._journal_changed,
+                            removed=self._journal_removed)
+        self._journal_changed = set()
+        self._journal_removed = []
+        error = self.journal.pop_error()
+        if error is not None:
+            show_warning("Autosave stopped, ROI edits are no longer journaled: "
+                         f"{error}")
 
     def on_set_start(self):
+        self._trace("action", "set_start")
         idx = self.model.get_selected_single_roi_index()
         if idx is None:
             show_warning("Select exactly one cropping box.")
             return
         
         curr_axis = self.model.get_track_axis(idx)
-        slice_idx = self.model.viewer.dims.current_step[curr_axis]
+        slice_idx = self.model.current_position_um(curr_axis)
         self.model.set_scroll_start_um(idx, slice_idx)
+        self._mark_changed([idx])
         self.update_rois()
 
     def on_set_stop(self):
+        self._trace("action", "set_stop")
         idx = self.model.get_selected_single_roi_index()
         if idx is None:
             show_warning("Select exactly one cropping box.")
             return
         
         curr_axis = self.model.get_track_axis(idx)
-        slice_idx = self.model.viewer.dims.current_step[curr_axis]
+        slice_idx = self.model.current_position_um(curr_axis)
         self.model.set_scroll_end_um(idx, slice_idx)
+        self._mark_changed([idx])
         self.update_rois()
 
+    def _set_range_from_cursor(self, start: bool):
+        self._trace("action", "set_range_start" if start else "set_range_stop",
+                    row=self.gui.get_range_axis_row())
+        idx = self.model.get_selected_single_roi_index()
+        if idx is None:
+            show_warning("Select exactly one cropping box.")
+            return
+
+        row = self.gui.get_range_axis_row()
+        if not 0 <= row < len(self.model.range_axes):
+            return
+        axis = self.model.range_axes[row]
+        value = self.model.current_position_um(axis)
+        if start:
+            self.model.set_axis_start_um(idx, axis, value)
+        else:
+            self.model.set_axis_end_um(idx, axis, value)
+        self._mark_changed([idx])
+        self.update_rois()
+
+    def on_set_range_start(self):
+        self._set_range_from_cursor(start=True)
+
+    def on_set_range_stop(self):
+        self._set_range_from_cursor(start=False)
+
     def on_clear_rois(self):
+        self._trace("action", "clear")
         self.selected_roi_idx = None
         self._restoring_selection = True
         try:
@@ -194,6 +338,7 @@ class CroppingController:
         
         with self._suspend_sync():
             self.model.clear_rois()
+        self._mark_changed()
         
         self.update_rois()
         self._apply_selected_roi()
@@ -205,31 +350,121 @@ class CroppingController:
             show_warning("No cropping box drawn!")
             return
 
-        out_path = Path(self.gui.txt_file.text())
-        if out_path.suffix.lower() != ".csv":
-            show_warning("Only CSV saving is implemented for now.")
+        out_path = self.gui.get_output_path()
+        suffix = path_suffix(out_path)
+        if suffix not in (".csv", ".zarr", ".npy", ".tif", ".tiff"):
+            show_warning(
+                "Only CSV, OME-Zarr, NPY and TIFF saving are implemented for now.")
             return
+        is_crop = suffix != ".csv"
         
-        if out_path.exists():
+        resume = False
+        if is_crop and self.model.crop_output_exists(out_path, self.gui.txt_tag.text()):
+            reply = QMessageBox.question(
+                self.gui,
+                "Resume export?", f"'{path_name(out_path)}' already exists.\n\n"
+                "Resume it (completed chunks are verified and kept)? "
+                "Choose 'Discard' to export everything again.",
+            QMessageBox.Yes | QMessageBox.Discard | QMessageBox.Cancel,
+            QMessageBox.Yes,
+            )
+            if reply == QMessageBox.Cancel:
+                return
+            resume = reply == QMessageBox.Yes
+        elif not is_crop and path_exists(out_path):
             reply = QMessageBox.question(
                 self.gui,  # or self.viewer.window.qt_viewer, or None
-                "Overwrite file?", f"File '{out_path.name}' already exists.\n\nDo you want to overwrite it?",
+                "Overwrite file?",
+                f"File '{path_name(out_path)}' already exists.\n\n"
+                "Do you want to overwrite it?",
             QMessageBox.Yes | QMessageBox.No,
             QMessageBox.No,
             )
             if reply != QMessageBox.Yes:
                 return
 
-        saved = self.model.save_csv(out_path, self.gui.txt_tag.text())
-        show_info(f"ROI coordinates saved to {saved.name}!")
+        if is_crop:
+            try:
+                resolution = self.gui.get_requested_resolution()
+            except ValueError:
+                show_warning("Export resolution must be numeric.")
+                return
+            try:
+                binning = self.gui.get_requested_binning()
+            except ValueError:
+                show_warning("Binning must be positive integers.")
+                return
+            codec, codec_level, tuning_target = self.gui.get_codec()
+            try:
+                export = self.model.plan_crop_export(out_path, self.gui.txt_tag.text(),
+                                                     resolution=resolution,
+                                                     binning=binning,
+                                                     reduction=self.gui.get_reduction(),
+                                                     pyramid_levels=self.gui.get_pyramid_levels(),
+                                                     resume=resume,
+                                                     codec=codec,
+                                                     codec_level=codec_level,
+                                                     tuning_target=tuning_target,
+                                                     max_workers=self.gui.get_write_workers())
+            except (ValueError, ImportError, OSError) as e:
+                show_warning(str(e))
+                return
+            self._start_export(export)
+            return
+
+        try:
+            saved = self.model.save_csv(out_path, self.gui.txt_tag.text())
+        except (ImportError, OSError) as e:
+            show_warning(str(e))
+            return
+        show_info(f"ROI coordinates saved to {path_name(saved)}!")
+
+    def _start_export(self, export: CropExport):
+        """Run `export` in a worker thread.
+
+        The GUI shows its progress and can cancel it.
+        """
+        self._export_cancel = threading.Event()
+        self.gui.set_exporting(True)
+        self._export_worker = create_worker(
+            export.run,
+            progress=self.gui.export_progress.emit,
+            cancel=self._export_cancel,
+            _connect={
+                "returned": self._on_export_returned,
+                "errored": self._on_export_errored,
+                "finished": self._on_export_finished,
+            },
+        )
+
+    def cancel_export(self):
+        """Stop a running export after the slabs in flight."""
+        if self._export_worker is not None:
+            self._export_cancel.set()
+            self.gui.btn_cancel_export.setEnabled(False)
+
+    def _on_export_returned(self, saved):
+        show_info(f"Cropped ROIs saved to {path_name(saved)}!")
+
+    def _on_export_errored(self, error: Exception):
+        if isinstance(error, ExportCancelled):
+            show_info("Export cancelled; save again and choose 'Resume' to finish it.")
+        else:
+            show_warning(str(error))
+
+    def _on_export_finished(self):
+        self._export_worker = None
+        self.gui.set_exporting(False)
 
     def on_roi_selected_from_list(self, row: int):
         if self._restoring_selection:
             return
+        self._trace("action", "list_select", row=row)
         if 0 <= row < self.model.num_rois():
             self._set_selected_roi(row)
 
     def on_delete_selected(self):
+        self._trace("action", "delete")
         idx = self.selected_roi_idx
         if idx is None:
             show_warning("Select exactly one ROI to delete.")
@@ -255,6 +490,9 @@ class CroppingController:
         # Delete ROI
         with self._suspend_sync():
             self.model.delete_roi(idx)
+        # the data setter trims properties from the end: later ROIs changed too
+        self._mark_removed([idx])
+        self._mark_changed(range(idx, self.model.num_rois()))
 
         # Choose new selection after deletion
         self.selected_roi_idx = new_idx
@@ -266,6 +504,8 @@ class CroppingController:
         show_info(f"ROI {idx:02} deleted!")
 
     def on_set_rectangle_size(self):
+        self._trace("action", "set_size",
+                    size=[self.gui.txt_size_x.text(), self.gui.txt_size_y.text()])
         idx = self.model.get_selected_single_roi_index()
         if idx is None:
             show_warning("Select exactly one ROI.")
@@ -282,10 +522,12 @@ class CroppingController:
             return
 
         try:
-            self.model.set_rectangle_size(idx, size_x=size_x, size_y=size_y)
+            with self._suspend_sync():
+                self.model.set_rectangle_size(idx, size_x=size_x, size_y=size_y)
         except ValueError as e:
             show_warning(str(e))
             return
 
+        self._mark_changed([idx])
         self.update_rois()
         show_info(f"Updated ROI {idx:02} size.")
\ No newline at end of file
@@ -0,0 +1,593 @@
+# cropping/export.py
+"""Backend-independent, slab-by-slab export of ROI crops."""
+from __future__ import annotations
+
+import itertools
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .compression import (
+    AUTO,
+    DEFAULT_CODEC,
+    DEFAULT_LEVEL,
+    CodecChoice,
+    make_compressor,
+    tune_codec,
+)
+from .manifest import MANIFEST_NAME, ExportManifest
+from .storage import OutputPath, join_path, make_parent_dirs
+
+if TYPE_CHECKING:
+    import threading
+    from collections.abc import Callable, Iterator
+
+_AXIS_TYPES = {"t": "time", "c": "channel"}
+
+REDUCTIONS = ("mean", "max", "mode")
+
+DEFAULT_WRITE_WORKERS = 4
+
+DEFAULT_SLAB_BYTES = 32 * 2**20  # target size of one slab held in memory
+# bound on the slab data (read-ahead and binned blocks) in flight in an export
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+
+
+class ExportCancelled(Exception):
+    """Raised by `export_crops` when its `cancel` event is set."""
+
+
+@dataclass
+class RoiCrop:
+    """One ROI to export: its output name and half-open pixel bounds per axis."""
+    name: str
+    bounds_px: np.ndarray  # (ndim, 2) -> [start, stop) per axis
+    translation: np.ndarray | None = None  # world position of the first voxel
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """Shape of the crop in source pixels."""
+        return tuple(int(stop - start) for start, stop in self.bounds_px)
+
+    def source_region(self, region: tuple[slice, ...]) -> tuple[slice, ...]:
+        """Map a region of the crop to the matching region of the source."""
+        return tuple(slice(int(start) + r.start, int(start) + r.stop)
+                     for (start, _), r in zip(self.bounds_px, region, strict=True))
+
+
+def default_chunks(shape: tuple[int, ...]) -> tuple[int, ...]:
+    """One chunk per index along leading (t, c) axes, bounded blocks in z/y/x."""
+    n_leading = max(len(shape) - 3, 0)
+    spatial_max = (32, 256, 256)[-min(len(shape), 3):]
+    return (
+        (1,) * n_leading
+        + tuple(max(min(s, c), 1)
+                for s, c in zip(shape[n_leading:], spatial_max, strict=True))
+    )
+
+
+def _plane_steps(
+    shape: tuple[int, ...],
+    chunks: tuple[int, ...],
+    max_items: int | None,
+) -> tuple[int, ...]:
+    """Slab extent along the last two axes.
+
+    The whole plane, or as many rows of chunks (then chunks of one row) as keep
+    a slab within `max_items`.
+    """
+    plane = tuple(shape[-2:])
+    if max_items is None or len(shape) < 2:
+        return plane
+    depth = int(np.prod([min(c, s) for c, s
+                         in zip(chunks[:-2], shape[:-2], strict=True)]))
+    budget = max_items // max(depth, 1)
+    if plane[0] * plane[1] <= budget:
+        return plane
+    cy, cx = (max(min(c, s), 1) for c, s in zip(chunks[-2:], plane, strict=True))
+    rows = budget // (cy * plane[1])
+    if rows >= 1:
+        return rows * cy, plane[1]
+    return cy, max(budget // (cy * cx), 1) * cx
+
+
+def iter_slabs(
+    shape: tuple[int, ...],
+    chunks: tuple[int, ...],
+    max_items: int | None = None,
+) -> Iterator[tuple[slice, ...]]:
+    """Chunk-aligned slabs covering `shape`.
+
+    Slabs are one chunk thick along every axis but the last two. For a
+    (T, C, Z, Y, X) crop this yields one timepoint/channel/z-block at a time,
+    so memory stays constant whatever the number of timepoints. Slabs span
+    whole y/x planes unless that exceeds `max_items` elements; they are
+    then split along the y/x chunk grid (never below one chunk).
+    """
+    steps = tuple(chunks[:-2]) + _plane_steps(shape, chunks, max_items)
+    axes = [range(0, s, st) for s, st in zip(shape, steps, strict=True)]
+    for starts in itertools.product(*axes):
+        yield tuple(slice(a, min(a + st, s))
+                    for a, st, s in zip(starts, steps, shape, strict=True))
+
+
+def _mode_rows(values: np.ndarray) -> np.ndarray:
+    """Most frequent value of every row (smallest value on ties)."""
+    ordered = np.sort(values, axis=1)
+    n_rows, n_cols = ordered.shape
+    cols = np.arange(n_cols)
+    is_start = np.ones(ordered.shape, dtype=bool)
+    is_start[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    run_start = np.maximum.accumulate(np.where(is_start, cols, 0), axis=1)
+    best = (cols - run_start).argmax(axis=1)
+    return ordered[np.arange(n_rows), best]
+
+
+def bin_block(
+    block: np.ndarray,
+    factors: tuple[int, ...],
+    reduction: str = "mean",
+) -> np.ndarray:
+    """Reduce `block` by an integer factor per axis.
+
+    Trailing partial bins are padded by edge repetition, so the output shape is
+    `ceil(block.shape / factors)`. Integer means are rounded back to the input
+    dtype; `mode` keeps label values intact.
+    """
+    factors = tuple(int(f) for f in factors)
+    if all(f == 1 for f in factors):
+        return block
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Unknown reduction '{reduction}'.")
+
+    pad = [(0, -s % f) for s, f in zip(block.shape, factors, strict=True)]
+    if any(after for _, after in pad):
+        block = np.pad(block, pad, mode="edge")
+    split = []
+    for s, f in zip(block.shape, factors, strict=True):
+        split += [s // f, f]
+    binned = block.reshape(split)
+    bin_axes = tuple(range(1, 2 * block.ndim, 2))
+
+    if reduction == "max":
+        return binned.max(axis=bin_axes)
+    if reduction == "mean":
+        out = binned.mean(axis=bin_axes)
+        if np.issubdtype(block.dtype, np.integer):
+            out = np.rint(out)
+        return out.astype(block.dtype, copy=False)
+
+    out_axes = tuple(range(0, 2 * block.ndim, 2))
+    moved = binned.transpose(out_axes + bin_axes)
+    out_shape = moved.shape[:block.ndim]
+    return _mode_rows(moved.reshape(int(np.prod(out_shape)), -1)).reshape(out_shape)
+
+
+def block_checksum(blocks: list[np.ndarray]) -> int:
+    """CRC32 over the raw bytes of `blocks`, in order."""
+    crc = 0
+    for block in blocks:
+        crc = zlib.crc32(np.ascontiguousarray(block).data, crc)
+    return crc
+
+
+def region_key(region: tuple[slice, ...]) -> str:
+    """Manifest key of a slab: its start along every axis."""
+    return ",".join(str(r.start) for r in region)
+
+
+def ome_axes(axis_names: tuple) -> list[dict]:
+    """NGFF axes metadata for `axis_names`."""
+    return [{"name": a, "type": _AXIS_TYPES.get(a, "space")} for a in axis_names]
+
+
+def pyramid_factors(
+    shape: tuple[int, ...],
+    scale: list[float],
+    spatial: list[bool],
+    n_levels: int,
+) -> list[np.ndarray]:
+    """Per-level 2x downsampling factors, each relative to the previous level.
+
+    Only spatial axes are downsampled, and only those whose pixel size is
+    within 2x of the finest one, so anisotropic z is left alone until x/y have
+    caught up. Stops early once every spatial axis is down to one pixel.
+    """
+    shape = np.array(shape, dtype=int)
+    cur_scale = np.array(scale, dtype=float)
+    spatial = np.array(spatial, dtype=bool)
+    factors = []
+    for _ in range(n_levels - 1):
+        movable = spatial & (shape > 1)
+        if not movable.any():
+            break
+        finest = cur_scale[movable].min()
+        step = np.where(movable & (cur_scale < 2 * finest), 2, 1)
+        factors.append(step)
+        shape = -(-shape // step)
+        cur_scale = cur_scale * step
+    return factors
+
+
+class CropWriter(ABC):
+    """Export backend: one output per ROI, fed slab by slab by `export_crops`.
+
+    `write` returns the checksum of what it wrote; `checksum` recomputes it from
+    the output, so a resumed export can verify a slab instead of redoing it.
+    """
+
+    manifest_path: OutputPath | None = None
+
+    def tune(self, shape: tuple[int, ...], read, previous: dict | None = None):
+        """Optional hook called once per ROI before `plan_chunks`.
+
+        `read(region)` reads the output data; `previous` is the ROI's spec from
+        a previous run, if any. Writers with nothing to tune keep this default.
+        """
+        return None
+
+    def plan_chunks(self, shape: tuple[int, ...], dtype,
+                    slab_bytes: int = DEFAULT_SLAB_BYTES) -> tuple[int, ...]:
+        """Chunk shape of an output of `shape` and `dtype`.
+
+        Slabs are one chunk thick along every axis but the last two; writers
+        free to pick any chunking size them to about `slab_bytes`.
+        """
+        return default_chunks(shape)
+
+    def describe(self) -> dict:
+        """Writer settings that change the output bytes (part of the ROI spec)."""
+        return {}
+
+    @abstractmethod
+    def create(self, crop: RoiCrop, shape: tuple[int, ...], dtype,
+               chunks: tuple[int, ...], resume: bool = False):
+        """Create (or, with `resume`, reopen) the output of one ROI."""
+
+    @abstractmethod
+    def write(self, target, region: tuple[slice, ...], block: np.ndarray) -> int:
+        """Write one slab and return its checksum."""
+
+    def checksum(self, target, region: tuple[slice, ...]) -> int | None:
+        """Checksum of a slab already on disk, or None if it cannot be read back."""
+        return None
+
+    def close(self):
+        """Optional hook called once after every ROI was written."""
+        return None
+
+
+@dataclass
+class _ZarrTarget:
+    arrays: list
+    factors: list[np.ndarray]  # per level, relative to the previous one
+    cumulative: list[np.ndarray]  # per level, relative to level 0
+
+
+class ZarrCropWriter(CropWriter):
+    """Writes every ROI as an OME-Zarr (NGFF 0.4) image group of one store.
+
+    With `pyramid_levels` > 1, downsampled levels are computed from each slab
+    as it is written, so the output never needs a second read pass.
+    `codec` is one of "blosc-lz4", "zstd", "none" or "auto"; "auto" samples each
+    ROI and picks the codec, level and chunk shape best for `tuning_target`
+    ("throughput" or "size"), recording the measurements in the group attrs.
+    """
+
+    def __init__(
+        self,
+        out_path: OutputPath,
+        axis_names: tuple,
+        scale: tuple,
+        pyramid_levels: int = 1,
+        reduction: str = "mean",
+        resume: bool = False,
+        codec: str = DEFAULT_CODEC,
+        codec_level: int = DEFAULT_LEVEL,
+        tuning_target: str = "throughput",
+    ):
+        """Open (or, with `resume`, reopen) the store at `out_path`."""
+        import zarr
+
+        self.out_path = out_path
+        self.manifest_path = join_path(out_path, MANIFEST_NAME)
+        self.axis_names = tuple(axis_names)
+        self.scale = [float(s) for s in scale]
+        self.pyramid_levels = max(int(pyramid_levels), 1)
+        self.reduction = reduction
+        self.codec = codec
+        self.codec_level = int(codec_level)
+        self.tuning_target = tuning_target
+        self._choice = CodecChoice(codec, self.codec_level) if codec != AUTO else None
+        self.spatial = [_AXIS_TYPES.get(a, "space") == "space"
+                        for a in self.axis_names]
+        self.root = zarr.open_group(str(out_path), mode="a" if resume else "w",
+                                    zarr_format=2)
+        self._rois: dict[str, list] = {}
+
+    def _level_factors(self, shape: tuple[int, ...]) -> list[np.ndarray]:
+        return pyramid_factors(shape, self.scale, self.spatial, self.pyramid_levels)
+
+    def tune(self, shape: tuple[int, ...], read, previous: dict | None = None):
+        """Pick the codec of this ROI in auto mode."""
+        if self.codec != AUTO:
+            return
+        if (previous is not None and previous.get("codec_mode") == AUTO
+                and previous.get("tuning_target") == self.tuning_target
+                and previous.get("shape") == list(shape)):
+            # resuming: keep the earlier choice so completed chunks stay valid
+            self._choice = CodecChoice(previous["codec"], previous["codec_level"],
+                                       tuple(previous["base_chunks"]), None)
+            return
+        self._choice = tune_codec(shape, read, target=self.tuning_target)
+
+    def plan_chunks(self, shape: tuple[int, ...], dtype,
+                    slab_bytes: int = DEFAULT_SLAB_BYTES) -> tuple[int, ...]:
+        """Chunks of the chosen or default shape, rounded up to whole bins."""
+        # slabs must start on a multiple of the coarsest level's factor
+        total = np.ones(len(shape), dtype=int)
+        for f in self._level_factors(shape):
+            total = total * f
+        base = (self._choice.chunks if self._choice is not None
+                and self._choice.chunks else default_chunks(shape))
+        return tuple(int(-(-c // t) * t) if c < s else int(c)
+                     for c, t, s in zip(base, total, shape, strict=True))
+
+    def describe(self) -> dict:
+        """Format, pyramid and codec settings of the store."""
+        choice = self._choice or CodecChoice(DEFAULT_CODEC, DEFAULT_LEVEL)
+        return {"format": "ome-zarr", "scale": self.scale,
+                "pyramid_levels": self.pyramid_levels,
+                "pyramid_reduction": self.reduction,
+                "codec_mode": self.codec,
+                "tuning_target": self.tuning_target if self.codec == AUTO else None,
+                "codec": choice.codec, "codec_level": choice.level,
+                "base_chunks": list(choice.chunks) if choice.chunks else None}
+
+    def _open_or_create(self, group, name, shape, chunks, dtype, resume):
+        if resume and name in group:
+            arr = group[name]
+            if (arr.shape == shape and arr.chunks == chunks
+                    and arr.dtype == np.dtype(dtype)):
+                return arr
+        choice = self._choice or CodecChoice(DEFAULT_CODEC, DEFAULT_LEVEL)
+        return group.create_array(
+            name, shape=shape, chunks=chunks, dtype=dtype, overwrite=True,
+            compressors=make_compressor(choice.codec, choice.level),
+        )
+
+    def create(self, crop: RoiCrop, shape: tuple[int, ...], dtype,
+               chunks: tuple[int, ...], resume: bool = False):
+        """Create the image group and the arrays of every pyramid level."""
+        group = self.root.require_group(crop.name)
+        if crop.translation is not None:
+            translation = np.array(crop.translation, dtype=float)
+        else:
+            translation = np.array([float(start) * s for (start, _), s
+                                    in zip(crop.bounds_px, self.scale, strict=True)])
+
+        factors = self._level_factors(shape)
+        cumulative = [np.ones(len(shape), dtype=int)]
+        for f in factors:
+            cumulative.append(cumulative[-1] * f)
+
+        arrays, datasets = [], []
+        base_scale = np.array(self.scale)
+        for level, total in enumerate(cumulative):
+            level_shape = tuple(int(-(-s // t))
+                                for s, t in zip(shape, total, strict=True))
+            # one slab fills whole chunks at every level (no read-modify-write)
+            level_chunks = tuple(max(min(c // t, s), 1) for c, t, s
+                                 in zip(chunks, total, level_shape, strict=True))
+            arrays.append(self._open_or_create(
+                group, str(level), level_shape, level_chunks, dtype, resume))
+            # coarser voxels are centred on the block of voxels they reduce
+            level_translation = translation + (total - 1) / 2 * base_scale
+            datasets.append({
+                "path": str(level),
+                "coordinateTransformations": [
+                    {"type": "scale", "scale": (base_scale * total).tolist()},
+                    {"type": "translation",
+                     "translation": level_translation.tolist()},
+                ],
+            })
+
+        choice = self._choice or CodecChoice(DEFAULT_CODEC, DEFAULT_LEVEL)
+        if choice.measurements is not None or "compression" not in group.attrs:
+            group.attrs["compression"] = {
+                "mode": self.codec,
+                "target": self.tuning_target if self.codec == AUTO else None,
+                **choice.as_metadata(),
+            }
+        group.attrs["multiscales"] = [{
+            "version": "0.4",
+            "name": crop.name,
+            "axes": ome_axes(self.axis_names),
+            "datasets": datasets,
+        }]
+        self._rois[crop.name] = crop.bounds_px.tolist()
+        return _ZarrTarget(arrays, factors, cumulative)
+
+    @staticmethod
+    def _level_region(region: tuple[slice, ...], total) -> tuple[slice, ...]:
+        return tuple(slice(r.start // int(t), -(-r.stop // int(t)))
+                     for r, t in zip(region, total, strict=True))
+
+    def write(self, target: _ZarrTarget, region: tuple[slice, ...],
+              block: np.ndarray) -> int:
+        """Write a slab to level 0 and its binned copies to the coarser levels."""
+        target.arrays[0][region] = block
+        blocks = [block]
+        for level, f in enumerate(target.factors, start=1):
+            block = bin_block(block, f, self.reduction)
+            level_region = self._level_region(region, target.cumulative[level])
+            target.arrays[level][level_region] = block
+            blocks.append(block)
+        return block_checksum(blocks)
+
+    def checksum(self, target: _ZarrTarget, region: tuple[slice, ...]) -> int:
+        """Checksum of a slab read back from every level."""
+        return block_checksum([
+            arr[self._level_region(region, total)]
+            for arr, total in zip(target.arrays, target.cumulative, strict=True)
+        ])
+
+    def close(self):
+        """Record the bounds of every exported ROI in the store attrs."""
+        self.root.attrs["rois"] = self._rois
+
+
+def export_crops(
+    source,
+    crops: list[RoiCrop],
+    writer: CropWriter,
+    binning: tuple[int, ...] | None = None,
+    reduction: str = "mean",
+    manifest: ExportManifest | None = None,
+    max_workers: int = 1,
+    progress: Callable[[float], None] | None = None,
+    cancel: threading.Event | None = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> None:
+    """Stream every ROI of `source` into `writer`, slab by slab.
+
+    With `binning`, each slab is read at `binning` times the output slab size
+    and reduced on the fly, so only binned data is ever written.
+
+    With a `manifest`, every written slab is recorded with its checksum. A ROI
+    whose spec is unchanged since a previous run only re-exports the slabs that
+    are missing or fail verification against the output.
+
+    Slabs cover whole output chunks, so up to `max_workers` of them are read
+    and written concurrently, overlapping the round trips of high-latency
+    stores. At most twice that many are in flight, holding at most about
+    `memory_budget` bytes of read and binned data: slabs are sized (split
+    along the y/x chunk grid if needed) so that they fit, and only a slab
+    larger than the whole budget is ever processed alone.
+
+    `progress` is called with the exported fraction (0 to 1) as slabs complete;
+    setting `cancel` stops the export after the slabs in flight, raising
+    `ExportCancelled` (a resumable manifest keeps what was written).
+    """
+    workers = max(int(max_workers), 1)
+    factors = (np.ones(source.ndim, dtype=int) if binning is None
+               else np.broadcast_to(np.asarray(binning, dtype=int), (source.ndim,)))
+    itemsize = np.dtype(source.dtype).itemsize
+    # bytes held per output element while its slab is in flight: the source
+    # read-ahead (binning factors more elements) and the binned block
+    item_bytes = itemsize * (int(np.prod(factors)) + 1)
+    slab_items = max(int(memory_budget) // (2 * workers * item_bytes), 1)
+    pool = ThreadPoolExecutor(max_workers=workers,
+                              thread_name_prefix="napari-crop-tool-export")
+    try:
+        for n_done_crops, crop in enumerate(crops):
+            if any(s <= 0 for s in crop.shape):
+                continue
+            shape = tuple(-(-s // int(f))
+                          for s, f in zip(crop.shape, factors, strict=True))
+
+            def read(region, crop=crop):
+                crop_region = tuple(slice(r.start * int(f), min(r.stop * int(f), s))
+                                    for r, f, s
+                                    in zip(region, factors, crop.shape, strict=True))
+                block = np.asarray(source[crop.source_region(crop_region)])
+                return bin_block(block, factors, reduction)
+
+            previous = manifest.rois.get(crop.name) if manifest is not None else None
+            writer.tune(shape, read, previous)
+            chunks = writer.plan_chunks(shape, source.dtype, slab_items * itemsize)
+            resume = False
+            if manifest is not None:
+                spec = {
+                    "bounds": crop.bounds_px.tolist(),
+                    "shape": shape,
+                    "chunks": chunks,
+                    "dtype": str(np.dtype(source.dtype)),
+                    "binning": [int(f) for f in factors],
+                    "reduction": reduction,
+                    **writer.describe(),
+                }
+                resume = manifest.start_roi(crop.name, spec)
+            target = writer.create(crop, shape, source.dtype, chunks, resume=resume)
+
+            def export_slab(region, crop=crop, read=read, target=target,
+                            resume=resume):
+                key = region_key(region)
+                if resume:
+                    expected = manifest.checksum(crop.name, key)
+                    if (expected is not None
+                            and writer.checksum(target, region) == expected):
+                        return key, None
+                return key, writer.write(target, region, read(region))
+
+            regions = list(iter_slabs(shape, chunks, slab_items))
+            pending = {}  # future -> bytes its slab holds
+            n_written = in_flight = 0
+
+            def record(done, crop=crop, n_crop=n_done_crops, regions=regions,
+                       pending=pending):
+                nonlocal n_written, in_flight
+                n_slabs = len(regions)
+                for future in done:
+                    in_flight -= pending.pop(future)
+                    key, crc = future.result()
+                    if crc is not None and manifest is not None:
+                        manifest.record_chunk(crop.name, key, crc)
+                n_written += len(done)
+                if progress is not None:
+                    progress((n_crop + n_written / n_slabs) / len(crops))
+
+            for region in regions:
+                if cancel is not None and cancel.is_set():
+                    record(wait(pending)[0])
+                    raise ExportCancelled("Export cancelled.")
+                cost = item_bytes * int(np.prod([r.stop - r.start for r in region]))
+                while pending and (len(pending) >= 2 * workers
+                                   or in_flight + cost > memory_budget):
+                    record(wait(pending, return_when=FIRST_COMPLETED)[0])
+                pending[pool.submit(export_slab, region)] = cost
+                in_flight += cost
+            while pending:
+                record(wait(pending, return_when=FIRST_COMPLETED)[0])
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if manifest is not None:
+            manifest.close()
+    writer.close()
+
+
+@dataclass
+class CropExport:
+    """An export planned on the GUI thread, run later (e.g. in a worker thread).
+
+    ROI bounds are fixed when planning, so editing ROIs while `run` is busy
+    does not change what is written.
+    """
+    source: object
+    crops: list[RoiCrop]
+    make_writer: Callable[[], CropWriter]
+    out_path: OutputPath
+    binning: np.ndarray | None = None
+    reduction: str = "mean"
+    resume: bool = False
+    max_workers: int = 1
+    memory_budget: int = DEFAULT_MEMORY_BUDGET
+
+    def run(self, progress: Callable[[float], None] | None = None,
+            cancel: threading.Event | None = None) -> OutputPath:
+        """Write every crop and return the output path."""
+        make_parent_dirs(self.out_path)
+        writer = self.make_writer()
+        export_crops(self.source, self.crops, writer,
+                     binning=self.binning,
+                     reduction=self.reduction,
+                     manifest=ExportManifest(writer.manifest_path, resume=self.resume),
+                     max_workers=self.max_workers,
+                     memory_budget=self.memory_budget,
+                     progress=progress,
+                     cancel=cancel)
+        return self.out_path
@@ -0,0 +1,183 @@
+# cropping/file_writers.py
+"""Uncompressed NPY and BigTIFF export backends written through memory maps."""
+from __future__ import annotations
+
+from abc import abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .export import DEFAULT_SLAB_BYTES, CropWriter, RoiCrop, block_checksum
+from .manifest import MANIFEST_NAME
+from .storage import OutputPath, is_url
+
+_TIFF_AXES = set("TCZYX")
+
+
+def roi_file_path(out_path: OutputPath, name: str) -> Path:
+    """Output file of one ROI: `crops.npy` -> `crops_<name>.npy`."""
+    out_path = Path(out_path)
+    return out_path.with_name(f"{out_path.stem}_{name}{out_path.suffix}")
+
+
+def _contiguous_span(shape: tuple[int, ...],
+                     region: tuple[slice, ...]) -> tuple[int, int] | None:
+    """Flat [start, stop) of `region` in a C-ordered array of `shape`.
+
+    None if the region is not one contiguous run of elements.
+    """
+    extents = [r.stop - r.start for r in region]
+    partial = [a for a, (e, s) in enumerate(zip(extents, shape, strict=True)) if e != s]
+    if partial and any(e != 1 for e in extents[:partial[-1]]):
+        return None
+    strides = np.cumprod((1, *shape[:0:-1]))[::-1]
+    start = int(sum(r.start * int(st) for r, st in zip(region, strides, strict=True)))
+    return start, start + int(np.prod(extents))
+
+
+@dataclass
+class _FileTarget:
+    path: Path
+    shape: tuple[int, ...]
+    dtype: np.dtype
+    offset: int  # byte offset of the first element in the file
+
+
+class _MemmapCropWriter(CropWriter):
+    """Writes every ROI to its own preallocated, uncompressed file.
+
+    Slabs hold whole y/x planes, as many as fit in the slab budget of the
+    export. Each one is copied straight into a memory map of just the bytes it
+    covers (such slabs are contiguous in C order), flushed and unmapped, so
+    memory use does not grow with the size of the crop.
+    """
+
+    format = ""
+
+    def __init__(self, out_path: OutputPath):
+        if is_url(out_path):
+            raise ValueError("NPY and TIFF crops can only be written to a local path.")
+        self.out_path = Path(out_path)
+        self.manifest_path = self.out_path.with_name(
+            f"{self.out_path.stem}_{MANIFEST_NAME}")
+
+    def describe(self) -> dict:
+        return {"format": self.format}
+
+    def plan_chunks(self, shape: tuple[int, ...], dtype,
+                    slab_bytes: int = DEFAULT_SLAB_BYTES) -> tuple[int, ...]:
+        # any chunking is fine for a memory map: as many whole planes per slab
+        # as fit in the budget, which keeps every slab one contiguous span
+        if len(shape) < 3:
+            return tuple(shape)
+        plane = int(np.prod(shape[-2:])) * np.dtype(dtype).itemsize
+        depth = min(max(slab_bytes // max(plane, 1), 1), shape[-3])
+        return (1,) * (len(shape) - 3) + (int(depth),) + tuple(shape[-2:])
+
+    @abstractmethod
+    def _allocate(self, path: Path, shape, dtype) -> int:
+        """Create a zero-filled output file; returns the byte offset of the data."""
+
+    @abstractmethod
+    def _existing(self, path: Path) -> _FileTarget | None:
+        """An existing output file usable as a memory map, or None."""
+
+    def create(self, crop: RoiCrop, shape: tuple[int, ...], dtype,
+               chunks: tuple[int, ...], resume: bool = False) -> _FileTarget:
+        path = roi_file_path(self.out_path, crop.name)
+        dtype = np.dtype(dtype)
+        if resume and path.exists():
+            existing = self._existing(path)
+            if (existing is not None and existing.shape == tuple(shape)
+                    and existing.dtype == dtype):
+                return existing
+        return _FileTarget(path, tuple(shape), dtype,
+                           self._allocate(path, tuple(shape), dtype))
+
+    @staticmethod
+    def _view(target: _FileTarget, region: tuple[slice, ...], mode: str):
+        span = _contiguous_span(target.shape, region)
+        if span is None:
+            full = np.memmap(target.path, dtype=target.dtype, mode=mode,
+                             offset=target.offset, shape=target.shape)
+            return full[region]
+        return np.memmap(target.path, dtype=target.dtype, mode=mode,
+                         offset=target.offset + span[0] * target.dtype.itemsize,
+                         shape=tuple(r.stop - r.start for r in region))
+
+    def write(self, target: _FileTarget, region: tuple[slice, ...],
+              block: np.ndarray) -> int:
+        view = self._view(target, region, "r+")
+        view[...] = block
+        view.flush()
+        del view
+        return block_checksum([block])
+
+    def checksum(self, target: _FileTarget, region: tuple[slice, ...]) -> int:
+        return block_checksum([self._view(target, region, "r")])
+
+
+class NpyCropWriter(_MemmapCropWriter):
+    """Writes every ROI as a `.npy` file next to `out_path`."""
+
+    format = "npy"
+
+    def _allocate(self, path: Path, shape, dtype) -> int:
+        mm = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        offset = mm.offset
+        del mm
+        return offset
+
+    def _existing(self, path: Path) -> _FileTarget | None:
+        try:
+            mm = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if not isinstance(mm, np.memmap) or not mm.flags.c_contiguous:
+            return None
+        return _FileTarget(path, mm.shape, mm.dtype, mm.offset)
+
+
+class TiffCropWriter(_MemmapCropWriter):
+    """Writes every ROI as an uncompressed BigTIFF next to `out_path`.
+
+    Pages are laid out contiguously, so the file is also readable as a memory
+    map by tifffile and by tools that only understand plain TIFF stacks.
+    """
+
+    format = "bigtiff"
+
+    def __init__(self, out_path: OutputPath, axis_names: tuple, scale: tuple):
+        """Axis names and pixel scale are stored in the TIFF metadata."""
+        import tifffile
+
+        super().__init__(out_path)
+        self._tifffile = tifffile
+        self.axis_names = tuple(axis_names)
+        self.scale = [float(s) for s in scale]
+
+    def describe(self) -> dict:
+        """Format and pixel scale written into every file."""
+        return {"format": self.format, "scale": self.scale}
+
+    def _allocate(self, path: Path, shape, dtype) -> int:
+        kwargs = {}
+        axes = "".join(a.upper() for a in self.axis_names)
+        if len(axes) == len(shape) and set(axes) <= _TIFF_AXES:
+            kwargs["metadata"] = {"axes": axes}
+        if len(self.scale) >= 2 and all(s > 0 for s in self.scale[-2:]):
+            kwargs["resolution"] = (1 / self.scale[-1], 1 / self.scale[-2])
+        mm = self._tifffile.memmap(str(path), shape=shape, dtype=dtype,
+                                   bigtiff=True, photometric="minisblack",
+                                   **kwargs)
+        offset = mm.offset
+        del mm
+        return offset
+
+    def _existing(self, path: Path) -> _FileTarget | None:
+        try:
+            mm = self._tifffile.memmap(str(path), mode="r")
+        except (OSError, ValueError):
+            return None
+        return _FileTarget(path, mm.shape, mm.dtype, mm.offset)
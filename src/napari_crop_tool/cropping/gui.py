@@ -5,11 +5,14 @@ from pathlib import Path
 from typing import Optional
 from qtpy.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QLabel,
-    QPushButton, QLineEdit, QFileDialog, 
-    QListWidget, QListWidgetItem
+    QPushButton, QLineEdit, QFileDialog, QComboBox, QSpinBox,
+    QListWidget, QListWidgetItem, QProgressBar
 )
 from qtpy.QtCore import Signal
 
+from .export import DEFAULT_WRITE_WORKERS
+from .storage import OutputPath, as_output_path
+
 class CroppingGUIQt(QWidget):
 
     set_start_clicked = Signal()
@@ -19,12 +22,17 @@ class CroppingGUIQt(QWidget):
     roi_selected = Signal(int)
     delete_selected_clicked = Signal()
     set_rectangle_size_clicked = Signal()
-
+    set_range_start_clicked = Signal()
+    set_range_stop_clicked = Signal()
+    cancel_export_clicked = Signal()
+    # exported fraction; may be emitted from the export worker thread
+    export_progress = Signal(float)
 
     def __init__(self, out_dir: Optional[Path] = None):
         super().__init__()
 
         self.out_dir = out_dir
+        self._roi_lines: list[str] = []
 
         root = QVBoxLayout(self)
         root.setContentsMargins(0, 0, 0, 0)
@@ -45,6 +53,18 @@ class CroppingGUIQt(QWidget):
         roi_buttons_row.addWidget(self.btn_set_start)
         roi_buttons_row.addWidget(self.btn_set_stop)
 
+        # ROI range along leading (time, channel, ...) axes, 4D+ only
+        self.range_row = QWidget()
+        range_layout = QHBoxLayout(self.range_row)
+        range_layout.setContentsMargins(0, 0, 0, 0)
+        self.cmb_range_axis = QComboBox()
+        self.btn_set_range_start = QPushButton("Set Range Start from Cursor")
+        self.btn_set_range_stop = QPushButton("Set Range End from Cursor")
+        range_layout.addWidget(self.cmb_range_axis)
+        range_layout.addWidget(self.btn_set_range_start)
+        range_layout.addWidget(self.btn_set_range_stop)
+        self.range_row.setVisible(False)
+
         # ROI delete button
         edit_row = QHBoxLayout()
         self.btn_delete_selected = QPushButton("Delete selected ROI")
@@ -65,6 +85,7 @@ class CroppingGUIQt(QWidget):
         self.btn_clear_rois = QPushButton("Clear ROI list")
 
         roi_layout.addLayout(roi_buttons_row)
+        roi_layout.addWidget(self.range_row)
         roi_layout.addLayout(edit_row)
         roi_layout.addLayout(size_row)
         roi_layout.addWidget(self.btn_clear_rois)
@@ -83,13 +104,80 @@ class CroppingGUIQt(QWidget):
         file_row.addWidget(self.txt_file, stretch=1)
         file_row.addWidget(self.btn_browse)
 
+        self.txt_resolution = QLineEdit()
+        self.txt_resolution.setPlaceholderText(
+            "Export resolution per px, e.g. 2 or 1,2,2 for z,y,x (optional)")
+
+        binning_row = QHBoxLayout()
+        self.txt_binning = QLineEdit()
+        self.txt_binning.setPlaceholderText(
+            "Binning, e.g. 2 or 1,2,2 for z,y,x (optional)")
+        self.cmb_reduction = QComboBox()
+        self.cmb_reduction.addItems(["auto", "mean", "max", "mode"])
+        self.cmb_reduction.setToolTip(
+            "Binning reduction ('auto': mode for labels, mean otherwise)")
+        binning_row.addWidget(self.txt_binning, stretch=1)
+        binning_row.addWidget(self.cmb_reduction)
+
+        pyramid_row = QHBoxLayout()
+        self.spn_pyramid_levels = QSpinBox()
+        self.spn_pyramid_levels.setRange(1, 8)
+        self.spn_pyramid_levels.setValue(1)
+        self.spn_pyramid_levels.setToolTip("OME-Zarr levels per crop (1 = no pyramid)")
+        self.spn_write_workers = QSpinBox()
+        self.spn_write_workers.setRange(1, 32)
+        self.spn_write_workers.setValue(DEFAULT_WRITE_WORKERS)
+        self.spn_write_workers.setToolTip(
+            "Slabs written in parallel (raise for remote/object-store outputs)")
+        pyramid_row.addWidget(QLabel("Pyramid levels"))
+        pyramid_row.addWidget(self.spn_pyramid_levels)
+        pyramid_row.addWidget(QLabel("Concurrent writes"))
+        pyramid_row.addWidget(self.spn_write_workers)
+        pyramid_row.addStretch(1)
+
+        codec_row = QHBoxLayout()
+        self.cmb_codec = QComboBox()
+        self.cmb_codec.addItems(["blosc-lz4", "zstd", "none", "auto"])
+        self.cmb_codec.setToolTip("Compressor of the OME-Zarr output "
+                                  "('auto' samples each ROI to choose)")
+        self.spn_codec_level = QSpinBox()
+        self.spn_codec_level.setRange(1, 9)
+        self.spn_codec_level.setValue(5)
+        self.spn_codec_level.setToolTip("Compression level")
+        self.cmb_tuning_target = QComboBox()
+        self.cmb_tuning_target.addItems(["throughput", "size"])
+        self.cmb_tuning_target.setToolTip("'auto' optimises for write MB/s or bytes")
+        self.cmb_tuning_target.setEnabled(False)
+        codec_row.addWidget(QLabel("Compression"))
+        codec_row.addWidget(self.cmb_codec, stretch=1)
+        codec_row.addWidget(self.spn_codec_level)
+        codec_row.addWidget(self.cmb_tuning_target)
+        self.cmb_codec.currentTextChanged.connect(self._on_codec_changed)
+
         self.btn_save = QPushButton("Save")
 
+        self.export_row = QWidget()
+        export_layout = QHBoxLayout(self.export_row)
+        export_layout.setContentsMargins(0, 0, 0, 0)
+        self.prg_export = QProgressBar()
+        self.prg_export.setRange(0, 1000)
+        self.prg_export.setFormat("Exporting… %p%")
+        self.btn_cancel_export = QPushButton("Cancel")
+        export_layout.addWidget(self.prg_export, stretch=1)
+        export_layout.addWidget(self.btn_cancel_export)
+        self.export_row.setVisible(False)
+
         save_layout.addWidget(QLabel("ROI Tag (optional)"))
         save_layout.addWidget(self.txt_tag)
-        save_layout.addWidget(QLabel("Output CSV"))
+        save_layout.addWidget(QLabel(
+            "Output file or URL (.csv coordinates, .zarr/.npy/.tif cropped data)"))
         save_layout.addLayout(file_row)
+        save_layout.addWidget(self.txt_resolution)
+        save_layout.addLayout(binning_row)
+        save_layout.addLayout(pyramid_row)
+        save_layout.addLayout(codec_row)
         save_layout.addWidget(self.btn_save)
+        save_layout.addWidget(self.export_row)
 
         root.addWidget(self.grp_roi, stretch=1)
         root.addWidget(self.grp_save)
@@ -105,24 +193,50 @@ class CroppingGUIQt(QWidget):
         self.roi_list.currentRowChanged.connect(self.roi_selected)
         self.btn_delete_selected.clicked.connect(self.delete_selected_clicked)
         self.btn_set_rectangle_size.clicked.connect(self.set_rectangle_size_clicked)
+        self.btn_set_range_start.clicked.connect(self.set_range_start_clicked)
+        self.btn_set_range_stop.clicked.connect(self.set_range_stop_clicked)
+        self.btn_cancel_export.clicked.connect(self.cancel_export_clicked)
+        self.export_progress.connect(self.set_export_progress)
 
     def get_tag(self) -> str:
         return self.txt_tag.text().strip()
 
-    def get_output_path(self) -> Path:
-        return Path(self.txt_file.text()).expanduser()
+    def get_output_path(self) -> OutputPath:
+        return as_output_path(self.txt_file.text())
 
     def set_output_path(self, p: Path) -> None:
         self.txt_file.setText(str(p))
 
+    def set_range_axes(self, axis_names: list[str]) -> None:
+        self.cmb_range_axis.clear()
+        for name in axis_names:
+            self.cmb_range_axis.addItem(name.upper())
+        self.range_row.setVisible(bool(axis_names))
+
+    def get_range_axis_row(self) -> int:
+        return self.cmb_range_axis.currentIndex()
+
     def set_cropping_enabled(self, enabled: bool) -> None:
         self.grp_roi.setEnabled(enabled)
         self.grp_save.setEnabled(enabled)
 
+    def set_exporting(self, exporting: bool) -> None:
+        self.btn_save.setEnabled(not exporting)
+        self.btn_cancel_export.setEnabled(True)
+        self.prg_export.setValue(0)
+        self.export_row.setVisible(exporting)
+
+    def set_export_progress(self, fraction: float) -> None:
+        self.prg_export.setValue(round(fraction * 1000))
+
     def clear_roi_labels(self) -> None:
+        self._roi_lines = []
         self.roi_list.clear()
 
     def set_roi_labels(self, roi_lines: list[str]) -> None:
+        if roi_lines == self._roi_lines:
+            return
+        self._roi_lines = list(roi_lines)
         current_row = self.roi_list.currentRow()
         self.roi_list.blockSignals(True)
         self.roi_list.clear()
@@ -155,10 +269,48 @@ class CroppingGUIQt(QWidget):
 
         return (_parse(self.txt_size_x), _parse(self.txt_size_y))
 
+    def get_requested_resolution(self) -> float | tuple[float, ...] | None:
+        txt = self.txt_resolution.text().strip()
+        if not txt:
+            return None
+        values = tuple(float(v) for v in txt.split(","))
+        return values[0] if len(values) == 1 else values
+
+    def get_requested_binning(self) -> int | tuple[int, ...] | None:
+        txt = self.txt_binning.text().strip()
+        if not txt:
+            return None
+        values = tuple(int(v) for v in txt.split(","))
+        if any(v < 1 for v in values):
+            raise ValueError("Binning factors must be >= 1.")
+        return values[0] if len(values) == 1 else values
+
+    def get_pyramid_levels(self) -> int:
+        return self.spn_pyramid_levels.value()
+
+    def get_write_workers(self) -> int:
+        return self.spn_write_workers.value()
+
+    def get_codec(self) -> tuple[str, int, str]:
+        return (self.cmb_codec.currentText(), self.spn_codec_level.value(),
+                self.cmb_tuning_target.currentText())
+
+    def _on_codec_changed(self, codec: str) -> None:
+        self.spn_codec_level.setEnabled(codec in ("blosc-lz4", "zstd"))
+        self.cmb_tuning_target.setEnabled(codec == "auto")
+
+    def get_reduction(self) -> str | None:
+        txt = self.cmb_reduction.currentText()
+        return None if txt == "auto" else txt
+
     def _browse_csv(self) -> None:
         start = self.txt_file.text().strip() or str(Path.home())
-        fn, _ = QFileDialog.getSaveFileName(self, "Save ROI CSV", start, "CSV (*.csv)")
+        fn, selected = QFileDialog.getSaveFileName(
+            self, "Save ROIs", start,
+            "CSV (*.csv);;OME-Zarr (*.zarr);;NumPy (*.npy);;BigTIFF (*.tif *.tiff)",
+        )
         if fn:
-            if not fn.lower().endswith(".csv"):
-                fn += ".csv"
+            if not fn.lower().endswith((".csv", ".zarr", ".npy", ".tif", ".tiff")):
+                fn += (".zarr" if "zarr" in selected else ".npy" if "npy" in selected
+                       else ".tif" if "tif" in selected else ".csv")
             self.txt_file.setText(fn)
\ No newline at end of file
@@ -0,0 +1,336 @@
+# cropping/journal.py
+"""Crash-safe, append-only autosave of the ROIs of a shapes layer."""
+from __future__ import annotations
+
+import os
+import queue
+import struct
+import threading
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+JOURNAL_DIR = Path.home() / ".napari-crop-tool" / "journals"
+
+_MAGIC = b"NCTJ"
+_VERSION = 1
+_FILE_HEADER = struct.Struct("<4sH")
+_RECORD_HEADER = struct.Struct("<BIII")  # op, roi index, payload size, crc32
+_ROI_HEADER = struct.Struct("<BHH")      # shape type, n vertices, ndim
+_PROP_VALUE = struct.Struct("<d")
+
+OP_SNAPSHOT = 1
+OP_SET = 2
+OP_INSERT = 3
+OP_DELETE = 4
+OP_CLEAR = 5
+
+SHAPE_TYPES = ("rectangle", "ellipse", "polygon", "line", "path")
+
+_STOP = object()
+
+
+@dataclass
+class JournalRoi:
+    """One ROI as stored in the journal (vertices + numeric properties)."""
+    shape_type: str
+    vertices: np.ndarray
+    properties: dict[str, float] = field(default_factory=dict)
+
+    def same_as(self, other: JournalRoi) -> bool:
+        """Whether both ROIs have the same type, vertices and properties."""
+        if self.shape_type != other.shape_type:
+            return False
+        if self.properties.keys() != other.properties.keys():
+            return False
+        if not np.array_equal(self.vertices, other.vertices):
+            return False
+        keys = list(self.properties)
+        return np.array_equal(
+            np.array([self.properties[k] for k in keys], dtype=float),
+            np.array([other.properties[k] for k in keys], dtype=float),
+            equal_nan=True,
+        )
+
+
+# ---- binary encoding ----
+def _encode_roi(roi: JournalRoi) -> bytes:
+    verts = np.ascontiguousarray(roi.vertices, dtype="<f8")
+    parts = [
+        _ROI_HEADER.pack(SHAPE_TYPES.index(roi.shape_type), *verts.shape),
+        verts.tobytes(),
+        struct.pack("<H", len(roi.properties)),
+    ]
+    for key, val in roi.properties.items():
+        key_b = key.encode()
+        parts.append(struct.pack("<B", len(key_b)) + key_b)
+        parts.append(_PROP_VALUE.pack(val))
+    return b"".join(parts)
+
+
+def _decode_roi(buf: bytes, offset: int = 0) -> tuple[JournalRoi, int]:
+    type_code, n_verts, ndim = _ROI_HEADER.unpack_from(buf, offset)
+    offset += _ROI_HEADER.size
+    n_bytes = n_verts * ndim * 8
+    verts = np.frombuffer(buf, dtype="<f8", count=n_verts * ndim, offset=offset)
+    verts = verts.reshape(n_verts, ndim).astype(float)
+    offset += n_bytes
+    (n_props,) = struct.unpack_from("<H", buf, offset)
+    offset += 2
+    props = {}
+    for _ in range(n_props):
+        key_len = buf[offset]
+        key = buf[offset + 1:offset + 1 + key_len].decode()
+        offset += 1 + key_len
+        (props[key],) = _PROP_VALUE.unpack_from(buf, offset)
+        offset += _PROP_VALUE.size
+    return JournalRoi(SHAPE_TYPES[type_code], verts, props), offset
+
+
+def _encode_record(op: int, idx: int = 0, payload: bytes = b"") -> bytes:
+    crc = zlib.crc32(payload, zlib.crc32(bytes((op,))))
+    return _RECORD_HEADER.pack(op, idx, len(payload), crc) + payload
+
+
+def _encode_snapshot(rois: list[JournalRoi]) -> bytes:
+    payload = b"".join(_encode_roi(r) for r in rois)
+    return _encode_record(OP_SNAPSHOT, len(rois), payload)
+
+
+def _replay(buf: bytes) -> list[JournalRoi]:
+    """Rebuild the ROI list from a journal buffer.
+
+    Replay stops at the first truncated or corrupt record, which is what a
+    crash in the middle of a write leaves behind.
+    """
+    if len(buf) < _FILE_HEADER.size:
+        return []
+    magic, version = _FILE_HEADER.unpack_from(buf, 0)
+    if magic != _MAGIC or version != _VERSION:
+        return []
+
+    rois: list[JournalRoi] = []
+    offset = _FILE_HEADER.size
+    while offset + _RECORD_HEADER.size <= len(buf):
+        op, idx, size, crc = _RECORD_HEADER.unpack_from(buf, offset)
+        start = offset + _RECORD_HEADER.size
+        payload = buf[start:start + size]
+        if len(payload) != size or zlib.crc32(payload, zlib.crc32(bytes((op,)))) != crc:
+            break
+        offset = start + size
+
+        if op == OP_SNAPSHOT:
+            rois = []
+            pos = 0
+            for _ in range(idx):
+                roi, pos = _decode_roi(payload, pos)
+                rois.append(roi)
+        elif op == OP_SET and idx < len(rois):
+            rois[idx] = _decode_roi(payload)[0]
+        elif op == OP_INSERT and idx <= len(rois):
+            rois.insert(idx, _decode_roi(payload)[0])
+        elif op == OP_DELETE and idx < len(rois):
+            del rois[idx]
+        elif op == OP_CLEAR:
+            rois = []
+        else:
+            break
+    return rois
+
+
+def _same(a: JournalRoi, b: JournalRoi) -> bool:
+    # the GUI thread reuses the objects of ROIs an edit did not touch
+    return a is b or a.same_as(b)
+
+
+def _diff(old: list[JournalRoi], new: list[JournalRoi]) -> list[bytes]:
+    """Smallest run of SET/INSERT/DELETE records turning `old` into `new`.
+
+    Unchanged ROIs at both ends are skipped, so a single edit, append or
+    deletion costs one record no matter how many ROIs the session holds, and
+    unchanged ROIs in between get no SET record.
+    """
+    if not new:
+        return [_encode_record(OP_CLEAR)] if old else []
+
+    n_old, n_new = len(old), len(new)
+    head = 0
+    while head < min(n_old, n_new) and _same(old[head], new[head]):
+        head += 1
+    tail = 0
+    while (tail < min(n_old, n_new) - head
+           and _same(old[n_old - 1 - tail], new[n_new - 1 - tail])):
+        tail += 1
+
+    old_mid = n_old - head - tail
+    new_mid = n_new - head - tail
+    records = []
+    for j in range(min(old_mid, new_mid)):
+        if not _same(old[head + j], new[head + j]):
+            records.append(
+                _encode_record(OP_SET, head + j, _encode_roi(new[head + j])))
+    for j in range(old_mid, new_mid):
+        records.append(_encode_record(OP_INSERT, head + j, _encode_roi(new[head + j])))
+    for _ in range(new_mid, old_mid):
+        records.append(_encode_record(OP_DELETE, head + new_mid))
+    return records
+
+
+def _to_roi(data, shape_types, columns: dict[str, np.ndarray], i: int) -> JournalRoi:
+    return JournalRoi(str(shape_types[i]), np.array(data[i], dtype=float),
+                      {k: float(v[i]) for k, v in columns.items()})
+
+
+class RoiJournal:
+    """Append-only, crash-safe autosave of the ROIs of one cropping session.
+
+    Every ROI mutation is appended as a small checksummed record by a
+    background thread; every `snapshot_every` records the file is compacted
+    into a single snapshot. The GUI thread only copies the ROIs an edit touched
+    and enqueues the resulting state.
+    """
+
+    def __init__(self, path: Path, snapshot_every: int = 256):
+        """Nothing is written until `start`."""
+        self.path = Path(path)
+        self.snapshot_every = snapshot_every
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._mirror: list[JournalRoi] = []  # what the file holds (writer thread)
+        self._latest: list[JournalRoi] = []  # current state (GUI thread)
+        self._n_since_snapshot = 0
+        self._fh = None
+        self.error: Exception | None = None  # why the writer thread stopped
+        self._error_reported = False
+
+    def read(self) -> list[JournalRoi]:
+        """ROIs recorded in the journal file (empty if none or unreadable)."""
+        try:
+            return _replay(self.path.read_bytes())
+        except (OSError, struct.error, ValueError, IndexError):
+            return []
+
+    def start(self, initial: list[JournalRoi] | None = None) -> None:
+        """Start the writer thread, compacting the journal to `initial`."""
+        if self._thread is not None:
+            return
+        self._mirror = list(initial or [])
+        self._latest = list(self._mirror)
+        self._thread = threading.Thread(
+            target=self._run, name="napari-crop-tool-journal", daemon=True
+        )
+        self._thread.start()
+
+    def record(self, data, shape_types, features, changed=None,
+               removed=()) -> None:
+        """Enqueue the current shapes state; cheap enough for every edit.
+
+        The ROIs at `removed` (indices before the edit) are dropped and only
+        those at `changed` are copied from the layer; `changed=None` copies all.
+        """
+        if self._thread is None or self.error is not None:
+            return
+        rois = self._latest
+        n = len(data)
+        for i in sorted(set(removed), reverse=True):
+            if 0 <= i < len(rois):
+                del rois[i]
+        if changed is None or len(rois) > n:
+            rois.clear()
+            changed = range(n)
+        rois.extend([None] * (n - len(rois)))
+        columns = {k: features[k].to_numpy(dtype=float) for k in features.columns
+                   if features[k].dtype.kind in "biuf"}
+        for i in changed:
+            if 0 <= i < n:
+                rois[i] = _to_roi(data, shape_types, columns, i)
+        if any(r is None for r in rois):
+            # an edit was not reported: fall back to copying everything
+            self._latest = [_to_roi(data, shape_types, columns, i)
+                            for i in range(n)]
+        self._queue.put(list(self._latest))
+
+    def pop_error(self) -> Exception | None:
+        """The error that stopped autosaving, returned only on the first call."""
+        if self.error is None or self._error_reported:
+            return None
+        self._error_reported = True
+        return self.error
+
+    def close(self) -> None:
+        """Flush pending records and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    # ---- writer thread ----
+    def _run(self):
+        try:
+            self._compact()
+            while True:
+                item = self._queue.get()
+                stop = item is _STOP
+                # only the latest state matters: coalesce the backlog
+                while not stop:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is _STOP:
+                        stop = True
+                    else:
+                        item = nxt
+                if item is not _STOP:
+                    self._write(item)
+                if stop:
+                    break
+        except Exception as exc:
+            # autosave is best effort and must never take the session down:
+            # stop recording (see `pop_error`) and drop what is still queued
+            self.error = exc
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+        finally:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def _write(self, rois: list[JournalRoi]):
+        records = _diff(self._mirror, rois)
+        self._mirror = rois
+        if not records:
+            return
+        self._n_since_snapshot += len(records)
+        if self._n_since_snapshot >= self.snapshot_every:
+            self._compact()
+            return
+        self._fh.write(b"".join(records))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def _compact(self):
+        """Atomically replace the journal by a single snapshot of the mirror."""
+        if self._fh is not None:
+            self._fh.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(_FILE_HEADER.pack(_MAGIC, _VERSION))
+            fh.write(_encode_snapshot(self._mirror))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "ab")
+        self._n_since_snapshot = 0
+
+
+def journal_path(layer_key: str) -> Path:
+    """Journal file of the shapes layer identified by `layer_key`."""
+    return JOURNAL_DIR / f"{layer_key}.roij"
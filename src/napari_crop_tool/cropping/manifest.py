@@ -0,0 +1,117 @@
+# cropping/manifest.py
+"""Resumable record of what an export has already written."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from .storage import OutputPath, get_fs, is_url
+
+MANIFEST_NAME = "crop_manifest.jsonl"
+
+
+class ExportManifest:
+    """Append-only record of exported ROIs and their checksummed output chunks.
+
+    One JSON object per line: a "roi" line with the ROI's export spec, then a
+    "chunk" line for every slab once it is fully written. A torn last line (a
+    killed job) is ignored on load, and its slab is simply exported again.
+
+    On an fsspec URL, where objects cannot be appended to, the lines are
+    buffered and the whole manifest is rewritten every `flush_every` lines.
+    """
+
+    def __init__(self, path: OutputPath, resume: bool = True, flush_every: int = 64):
+        """Load the lines already at `path` when resuming, else start afresh."""
+        self.remote = is_url(path)
+        self.path = path if self.remote else Path(path)
+        self.flush_every = flush_every
+        self.rois: dict[str, dict] = {}
+        self.chunks: dict[str, dict[str, int]] = {}
+        self._fh = None
+        self._lines: list[str] = []
+        self._n_pending = 0
+        if resume:
+            self._load()
+        elif self.remote:
+            fs, p = get_fs(self.path)
+            if fs.exists(p):
+                fs.rm(p)
+        else:
+            self.path.unlink(missing_ok=True)
+
+    def _read_text(self) -> str:
+        if self.remote:
+            fs, p = get_fs(self.path)
+            try:
+                return fs.cat_file(p).decode()
+            except FileNotFoundError:
+                return ""
+        return self.path.read_text()
+
+    def _load(self):
+        try:
+            lines = self._read_text().splitlines()
+        except OSError:
+            return
+        if self.remote:
+            self._lines = [line + "\n" for line in lines]
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("type") == "roi":
+                self.rois[entry["name"]] = entry["spec"]
+                self.chunks[entry["name"]] = {}
+            elif entry.get("type") == "chunk" and entry.get("roi") in self.chunks:
+                self.chunks[entry["roi"]][entry["key"]] = entry["checksum"]
+
+    def _append(self, entry: dict):
+        if self.remote:
+            self._lines.append(json.dumps(entry) + "\n")
+            self._n_pending += 1
+            if self._n_pending >= self.flush_every:
+                self._flush_remote()
+            return
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a")
+        self._fh.write(json.dumps(entry) + "\n")
+        self._fh.flush()
+
+    def matches(self, name: str, spec: dict) -> bool:
+        """True if `name` was already exported with exactly this spec."""
+        return self.rois.get(name) == spec
+
+    def start_roi(self, name: str, spec: dict) -> bool:
+        """Register a ROI export; returns True if its earlier chunks are reusable."""
+        spec = json.loads(json.dumps(spec))  # normalise tuples/numpy scalars
+        if self.matches(name, spec):
+            return True
+        self.rois[name] = spec
+        self.chunks[name] = {}
+        self._append({"type": "roi", "name": name, "spec": spec})
+        return False
+
+    def checksum(self, name: str, key: str) -> int | None:
+        """Recorded checksum of a slab of ROI `name`, or None if not written."""
+        return self.chunks.get(name, {}).get(key)
+
+    def record_chunk(self, name: str, key: str, checksum: int):
+        """Mark a slab of ROI `name` as fully written."""
+        self.chunks[name][key] = checksum
+        self._append({"type": "chunk", "roi": name, "key": key, "checksum": checksum})
+
+    def _flush_remote(self):
+        fs, p = get_fs(self.path)
+        fs.pipe_file(p, "".join(self._lines).encode())
+        self._n_pending = 0
+
+    def close(self):
+        """Flush buffered lines and close the file."""
+        if self._n_pending:
+            self._flush_remote()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
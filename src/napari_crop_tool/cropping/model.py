@@ -2,11 +2,36 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING
 import numpy as np
 import pandas as pd
 from napari import Viewer
-from napari.layers import Shapes
+from napari.layers import Labels, Layer, Shapes
+from napari.layers.base._base_constants import ActionType
+
+from .._utils import _get_axis_names
+from .compression import DEFAULT_CODEC, DEFAULT_LEVEL
+from .export import (
+    DEFAULT_MEMORY_BUDGET,
+    DEFAULT_WRITE_WORKERS,
+    CropExport,
+    RoiCrop,
+    ZarrCropWriter,
+)
+from .file_writers import NpyCropWriter, TiffCropWriter, roi_file_path
+from .storage import (
+    OutputPath,
+    as_output_path,
+    make_parent_dirs,
+    path_exists,
+    path_suffix,
+)
+from .transforms import CoordinateTransform, LayerTransformCache
+
+if TYPE_CHECKING:
+    from .journal import JournalRoi
 
 
 @dataclass
@@ -15,28 +40,44 @@ class CroppingModel:
     shapes_layer: Shapes
     scale: tuple
     out_dir: Path
+    target_layer: Layer | None = None
+    # level of detail: per-ROI labels only up to this many visible ROIs ...
+    label_limit: int = 200
+    # ... and only when zoomed in at least this far (screen px per world unit)
+    label_min_zoom: float = 0.25
 
     def __post_init__(self):
+        ndim = self.shapes_layer.ndim
+        self.axis_names = _get_axis_names(self.viewer.dims.axis_labels, ndim)
+        # Leading (t, c, ...) axes carry a per-ROI range of their own
+        self.range_axes = tuple(range(max(ndim - 3, 0)))
+
         # Configure shapes text labels
         self.shapes_layer.text = {
             "string": "{id}",
             "size": 12,
             "color": "white",
             "anchor": "upper_left",
-            "translation": [0, 0, 0],
+            "translation": [0] * ndim,
         }
 
-        # Compute default range (in px index units)
+        # Compute default range (in world units)
         self.min_um = np.array([self.viewer.dims.range[i][0] 
                            for i in range(self.shapes_layer.ndim)])
         self.max_um = np.array([self.viewer.dims.range[i][1] 
                            for i in range(self.shapes_layer.ndim)])
-        self.min_px = np.round(self.min_um / np.array(self.scale)).astype(int)
-        self.max_px = np.round(self.max_um / np.array(self.scale)).astype(int)
+
+        # World <-> data mapping of the target layer, rebuilt on transform change
+        self.transforms = (LayerTransformCache(self.target_layer)
+                           if self.target_layer is not None else None)
+        self.min_px = np.zeros(ndim, dtype=int)
+        self.max_px = self.get_transform().level_shapes[0] - 1
+        self._ids = np.array([], dtype=str)
+        self._visible = np.array([], dtype=bool)
 
     # ---- ROI helpers ----
     def num_rois(self) -> int:
-        return len(self.shapes_layer.data)
+        return self.shapes_layer.nshapes
 
     def get_selected_single_roi_index(self) -> int | None:
         sel = self.shapes_layer.selected_data
@@ -44,47 +85,186 @@ class CroppingModel:
             return None
         return next(iter(sel))
 
+    def get_scroll_axis(self) -> int:
+        """Spatial axis the viewer currently scrolls through."""
+        order = self.viewer.dims.order
+        spatial = [a for a in order[:-2] if a not in self.range_axes]
+        return spatial[-1] if spatial else order[0]
+
+    def range_keys(self, axis: int) -> tuple[str, str]:
+        name = self.axis_names[axis]
+        return f"start_{name}", f"end_{name}"
+
+    def _column(self, key: str) -> np.ndarray:
+        # one feature column; `properties` would convert every column each call.
+        # napari keeps stale rows when the data is emptied: trim / pad to n
+        col = np.asarray(self.shapes_layer.features[key], dtype=float)
+        n = self.num_rois()
+        if len(col) < n:
+            col = np.concatenate([col, np.full(n - len(col), np.nan)])
+        return col[:n]
+
+    def _value(self, key: str, idx: int) -> float:
+        return float(self.shapes_layer.features[key].iat[idx])
+
     def get_track_axis(self, idx: int) -> int:
-        val = self.shapes_layer.properties["track_axis"][idx]
+        val = self._value("track_axis", idx)
         return -1 if np.isnan(val) else int(val)
+
+    def get_track_axes(self) -> np.ndarray:
+        vals = self._column("track_axis")
+        return np.where(np.isnan(vals), -1, vals).astype(int)
+
+    def get_scroll_ranges_um(self) -> np.ndarray:
+        """(n, 2) [start, end] of every ROI along its own track axis."""
+        axes = self.get_track_axes()
+        start, end = self._column("start_idx"), self._column("end_idx")
+        return np.stack([np.where(np.isnan(start), self.min_um[axes], start),
+                         np.where(np.isnan(end), self.max_um[axes], end)], axis=1)
+
+    def get_axis_ranges_um(self, axis: int) -> np.ndarray:
+        """(n, 2) [start, end] of every ROI along a leading `axis`."""
+        start_key, end_key = self.range_keys(axis)
+        start, end = self._column(start_key), self._column(end_key)
+        return np.stack([np.where(np.isnan(start), self.min_um[axis], start),
+                         np.where(np.isnan(end), self.max_um[axis], end)], axis=1)
     
     def get_scroll_start_px(self, idx: int) -> int | float:
         curr_axis = self.get_track_axis(idx)
-        val = self.shapes_layer.properties["start_idx"][idx]
-        return (self.min_px[curr_axis] if np.isnan(val) 
-                else int(val / self.scale[curr_axis]))
+        return int(self.get_roi_bounds_px(idx)[curr_axis, 0])
 
     def get_scroll_end_px(self, idx: int) -> int | float:
         curr_axis = self.get_track_axis(idx)
-        val = self.shapes_layer.properties["end_idx"][idx]
-        return (self.max_px[curr_axis] if np.isnan(val) 
-                else int(val / self.scale[curr_axis]))
+        return int(self.get_roi_bounds_px(idx)[curr_axis, 1]) - 1
     
     def get_scroll_start_um(self, idx: int) -> int | float:
         curr_axis = self.get_track_axis(idx)
-        val = self.shapes_layer.properties["start_idx"][idx]
+        val = self._value("start_idx", idx)
         return (self.min_um[curr_axis] if np.isnan(val) 
                 else val)
 
     def get_scroll_end_um(self, idx: int) -> int | float:
         curr_axis = self.get_track_axis(idx)
-        val = self.shapes_layer.properties["end_idx"][idx]
+        val = self._value("end_idx", idx)
         return (self.max_um[curr_axis] if np.isnan(val) 
                 else val)
 
-    def set_scroll_start_um(self, idx: int, curr_index: int):
+    def get_axis_start_um(self, idx: int, axis: int) -> int | float:
+        val = self._value(self.range_keys(axis)[0], idx)
+        return self.min_um[axis] if np.isnan(val) else val
+
+    def get_axis_end_um(self, idx: int, axis: int) -> int | float:
+        val = self._value(self.range_keys(axis)[1], idx)
+        return self.max_um[axis] if np.isnan(val) else val
+
+    def _set_property(self, key: str, idx: int, value: float):
         props = dict(self.shapes_layer.properties)
-        start_idx = props["start_idx"].copy()
-        start_idx[idx] = curr_index
-        props["start_idx"] = start_idx
+        values = props[key].copy()
+        values[idx] = value
+        props[key] = values
         self.shapes_layer.properties = props
 
+    def set_scroll_start_um(self, idx: int, curr_index: int):
+        self._set_property("start_idx", idx, curr_index)
+
     def set_scroll_end_um(self, idx: int, curr_index: int):
-        props = dict(self.shapes_layer.properties)
-        end_idx = props["end_idx"].copy()
-        end_idx[idx] = curr_index
-        props["end_idx"] = end_idx
-        self.shapes_layer.properties = props
+        self._set_property("end_idx", idx, curr_index)
+
+    def set_axis_start_um(self, idx: int, axis: int, value: float):
+        self._set_property(self.range_keys(axis)[0], idx, value)
+
+    def set_axis_end_um(self, idx: int, axis: int, value: float):
+        self._set_property(self.range_keys(axis)[1], idx, value)
+
+    def get_roi_bounds_um(self, idx: int) -> np.ndarray:
+        """(ndim, 2) array of sorted [start, end] world bounds of one ROI."""
+        return self.get_rois_bounds_um([idx])[0]
+
+    def get_rois_bounds_um(self, indices: list[int] | None = None) -> np.ndarray:
+        """(n, ndim, 2) sorted [start, end] world bounds of ROIs."""
+        ndim = self.shapes_layer.ndim
+        if indices is None:
+            indices = range(self.num_rois())
+        indices = np.asarray(indices, dtype=int)
+        data = self.shapes_layer.data
+        bounds = np.empty((len(indices), ndim, 2), dtype=float)
+        for j, i in enumerate(indices):
+            roi = np.asarray(data[i])
+            bounds[j, :, 0] = roi.min(axis=0)
+            bounds[j, :, 1] = roi.max(axis=0)
+        if len(indices) == 0:
+            return bounds
+        for axis in self.range_axes:
+            bounds[:, axis] = self.get_axis_ranges_um(axis)[indices]
+        track = self.get_track_axes()[indices]
+        rows = np.flatnonzero(track >= 0)
+        bounds[rows, track[rows]] = self.get_scroll_ranges_um()[indices][rows]
+        return np.sort(bounds, axis=-1)
+
+    def _per_axis(self, values, fill, what: str) -> np.ndarray:
+        """One value per axis from a scalar or a sequence.
+
+        The sequence holds one value per spatial axis (leading axes get `fill`)
+        or one value per axis.
+        """
+        ndim = self.shapes_layer.ndim
+        spatial = [a for a in range(ndim) if a not in self.range_axes]
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        if len(values) == ndim and len(values) != len(spatial):
+            return values
+        if len(values) not in (1, len(spatial)):
+            raise ValueError(
+                f"{what} needs 1, {len(spatial)} (z, y, x) or {ndim} values, "
+                f"got {len(values)}.")
+        out = np.full(ndim, fill, dtype=float)
+        out[spatial] = values
+        return out
+
+    def get_transform(self) -> CoordinateTransform:
+        if self.transforms is not None:
+            return self.transforms.get()
+        # no target layer: scale-only mapping over the viewer range
+        shape = np.round(self.max_um / np.array(self.scale)).astype(int) + 1
+        return CoordinateTransform(
+            np.diag([*self.scale, 1.0]), [shape], np.ones((1, len(shape)))
+        )
+
+    def get_rois_bounds_px(
+        self, indices: list[int] | None = None, level: int = 0
+    ) -> np.ndarray:
+        """(n, ndim, 2) half-open [start, stop) pixel bounds of ROIs at `level`.
+
+        All boxes go through the layer transform in a single call.
+        """
+        if indices is None:
+            indices = range(self.num_rois())
+        boxes_um = self.get_rois_bounds_um(indices)
+        transform = self.get_transform()
+        bounds = np.round(transform.boxes_world_to_data(boxes_um, level))
+        bounds[..., 1] += 1
+        shape = transform.level_shapes[level]
+        return np.clip(bounds, 0, shape[:, None]).astype(int)
+
+    def get_roi_bounds_px(self, idx: int, level: int = 0) -> np.ndarray:
+        """(ndim, 2) array of half-open [start, stop) pixel bounds of one ROI."""
+        return self.get_rois_bounds_px([idx], level)[0]
+
+    def current_position_um(self, axis: int) -> float:
+        """World position of the viewer cursor slice along `axis`."""
+        return float(self.viewer.dims.point[axis])
+
+    @staticmethod
+    def roi_name(idx: int, tag: str) -> str:
+        prefix = f"{tag}_roi_" if tag else "roi_"
+        return f"{prefix}{idx:02}"
+
+    def crop_output_exists(self, out_path: OutputPath, tag: str) -> bool:
+        """True if `save_crops(out_path, tag)` would overwrite existing output."""
+        out_path = as_output_path(out_path)
+        if path_suffix(out_path) == ".zarr":
+            return path_exists(out_path)
+        return any(path_exists(roi_file_path(out_path, self.roi_name(i, tag)))
+                   for i in range(self.num_rois()))
 
     def clear_rois(self):
         self.shapes_layer.selected_data = set()
@@ -100,6 +280,44 @@ class CroppingModel:
         self.shapes_layer.data = data
         self.sync_properties()
 
+    def move_rois(self, vertices: dict[int, np.ndarray]):
+        """Replace the vertices of the given ROIs in place.
+
+        Assigning `shapes_layer.data` would rebuild and re-triangulate every
+        shape.
+        """
+        # napari has no public API to edit a single shape. `ShapeList.edit`
+        # would also rebuild the z-order of every shape on each call; moving
+        # a shape keeps its triangle count, so updating its mesh is enough
+        shapes = self.shapes_layer._data_view
+        with shapes.batched_updates():
+            for idx, verts in vertices.items():
+                shapes.shapes[idx].data = verts
+                shapes.update(idx)
+        self.shapes_layer.events.data(
+            value=self.shapes_layer.data,
+            action=ActionType.CHANGED,
+            data_indices=tuple(vertices),
+            vertex_indices=tuple(tuple(range(len(v))) for v in vertices.values()),
+        )
+
+    def restore_rois(self, rois: list[JournalRoi]):
+        """Re-add ROIs read back from an autosave journal."""
+        if not rois:
+            return
+        self.shapes_layer.add(
+            [r.vertices for r in rois],
+            shape_type=[r.shape_type for r in rois],
+        )
+        props = dict(self.shapes_layer.properties)
+        for key in props:
+            if key == "id":
+                continue
+            props[key] = np.array([r.properties.get(key, np.nan) for r in rois],
+                                  dtype=float)
+        self.shapes_layer.properties = props
+        self.sync_properties()
+
     def set_rectangle_size(self, idx: int, size_x: float | None = None, size_y: float | None = None):
         data = list(self.shapes_layer.data)
         roi = np.array(data[idx], dtype=float)
@@ -122,7 +340,7 @@ class CroppingModel:
             size_x = x_max - x_min
 
         curr_axis = self.get_track_axis(idx)
-        slice_idx = self.viewer.dims.current_step[curr_axis]
+        slice_idx = self.current_position_um(curr_axis)
 
         # Update ROI to new size
         new_roi = roi.copy()
@@ -147,45 +365,214 @@ class CroppingModel:
         self.shapes_layer.selected_data = {idx}
 
     def sync_properties(self):
-        """Ensure id / start_idx / end_idx arrays match current shapes."""
+        """Ensure id / start_idx / end_idx / axis range arrays match current shapes.
+
+        The layer (and its text labels) is only updated if a value changed, and
+        the string ids are only rebuilt when the number of ROIs changes.
+        """
         n = self.num_rois()
-        self.shapes_layer.properties = {
-            "id": np.array([str(i) for i in range(n)], dtype=str),
-            "start_idx": (np.array([self.get_scroll_start_um(i) for i in range(n)], 
-                                    dtype=float)),
-            "end_idx": (np.array([self.get_scroll_end_um(i) for i in range(n)], 
-                                  dtype=float)),
-            "track_axis": (np.array([self.get_track_axis(i) for i in range(n)], 
-                                  dtype=float)),
+        if len(self._ids) != n:
+            self._ids = np.arange(n).astype(str)
+        scroll = self.get_scroll_ranges_um()
+        props = {
+            "id": self._ids,
+            "start_idx": scroll[:, 0],
+            "end_idx": scroll[:, 1],
+            "track_axis": self.get_track_axes().astype(float),
         }
+        for axis in self.range_axes:
+            start_key, end_key = self.range_keys(axis)
+            ranges = self.get_axis_ranges_um(axis)
+            props[start_key] = ranges[:, 0]
+            props[end_key] = ranges[:, 1]
+
+        features = self.shapes_layer.features
+        if (set(features.columns) == set(props) and len(features) == n
+                and np.array_equal(features["id"].to_numpy(dtype=str), self._ids)
+                and all(np.array_equal(self._column(k), v, equal_nan=True)
+                        for k, v in props.items() if k != "id")):
+            return
+        self.shapes_layer.properties = props
 
-    # ---- saving ----
-    def save_csv(self, out_path: Path, tag: str) -> Path:
-        roi_df = pd.DataFrame(
-            columns=["x_start", "y_start", "x_end", "y_end", 
-                     "z_start", "z_end"]
-        )
-
-        id_to_axis = {0: "z", 1: "y", 2: "x"}
-        for i, roi in enumerate(self.shapes_layer.data):
-            roi_dict = {}
-            scroll_axis = self.shapes_layer.properties["track_axis"][i]
-            for axis in (0, 1, 2):
-                if axis == scroll_axis:
-                    start_um = self.get_scroll_start_um(i)
-                    end_um = self.get_scroll_end_um(i)
-                else:
-                    start_um = roi[:, axis].min()
-                    end_um = roi[:, axis].max()
-                
-                roi_dict[f"{id_to_axis[axis]}_start"] = np.round(min(start_um, end_um), 3)
-                roi_dict[f"{id_to_axis[axis]}_end"] = np.round(max(start_um, end_um), 3)
-            roi_df.loc[i] = roi_dict
+    # ---- level of detail ----
+    def visible_roi_mask(self, keep: int | None = None) -> np.ndarray:
+        """ROIs whose range covers the current slice.
 
-        prefix = f"{tag}_roi_" if tag else "roi_"
-        roi_df.index = [f"{prefix}{i:02}" for i in range(len(roi_df))]
+        Ranges are checked along the track axis of each ROI and every leading
+        axis; `keep` (e.g. the selected ROI) is always visible.
+        """
+        n = self.num_rois()
+        point = np.asarray(self.viewer.dims.point, dtype=float)
+        # half a step of slack so ROIs ending on the current slice stay visible
+        tol = np.array([r[2] / 2 for r in self.viewer.dims.range], dtype=float)
+        visible = np.ones(n, dtype=bool)
+        if n == 0:
+            return visible
+        axes = self.get_track_axes()
+        scroll = self.get_scroll_ranges_um()
+        lo, hi = scroll.min(axis=1), scroll.max(axis=1)
+        tracked = axes >= 0
+        pos, slack = point[axes], tol[axes]
+        visible &= ~tracked | ((pos >= lo - slack) & (pos <= hi + slack))
+        for axis in self.range_axes:
+            ranges = np.sort(self.get_axis_ranges_um(axis), axis=1)
+            visible &= ((point[axis] >= ranges[:, 0] - tol[axis])
+                        & (point[axis] <= ranges[:, 1] + tol[axis]))
+        if keep is not None and 0 <= keep < n:
+            visible[keep] = True
+        return visible
+
+    def slice_positions(self, keep: int | None = None) -> np.ndarray:
+        """(n, ndim) position of every ROI along the dims point.
+
+        That is the point itself, clamped into the ROI's range along its track
+        axis and every leading axis. ROIs whose range misses the point end up on
+        the nearest end of that range, off the current slice, so napari does not
+        draw them; `keep` is always placed on the point.
+        """
+        n = self.num_rois()
+        point = np.asarray(self.viewer.dims.point, dtype=float)
+        pos = np.tile(point, (n, 1))
+        if n == 0:
+            return pos
+        axes = self.get_track_axes()
+        scroll = np.sort(self.get_scroll_ranges_um(), axis=1)
+        rows = np.flatnonzero(axes >= 0)
+        pos[rows, axes[rows]] = np.clip(point[axes[rows]], scroll[rows, 0],
+                                        scroll[rows, 1])
+        for axis in self.range_axes:
+            ranges = np.sort(self.get_axis_ranges_um(axis), axis=1)
+            pos[:, axis] = np.clip(point[axis], ranges[:, 0], ranges[:, 1])
+        if keep is not None and 0 <= keep < n:
+            pos[keep] = point
+        return pos
+
+    def update_level_of_detail(self, visible: np.ndarray | None = None) -> None:
+        """Show per-ROI labels only when they can be read.
+
+        That is while few ROIs are `visible` and the view is zoomed in enough;
+        without `visible` the last mask is used.
+        """
+        if visible is not None:
+            self._visible = visible
+        layer = self.shapes_layer
+        show_labels = (int(np.count_nonzero(self._visible)) <= self.label_limit
+                       and self.viewer.camera.zoom >= self.label_min_zoom)
+        if layer.text.visible != show_labels:
+            layer.text.visible = show_labels
 
-        
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        roi_df.to_csv(out_path, index=True)
-        return out_path
\ No newline at end of file
+    # ---- saving ----
+    def save_csv(self, out_path: OutputPath, tag: str) -> OutputPath:
+        # Leading axes first, then the historical 3D column order
+        ndim = self.shapes_layer.ndim
+        leading = [self.axis_names[a] for a in range(ndim - 3)]
+        z, y, x = self.axis_names[-3:]
+        columns = [f"{a}_{side}" for a in leading for side in ("start", "end")]
+        columns += [f"{x}_start", f"{y}_start", f"{x}_end", f"{y}_end",
+                    f"{z}_start", f"{z}_end"]
+
+        rows = []
+        for i in range(self.num_rois()):
+            bounds = np.round(self.get_roi_bounds_um(i), 3)
+            roi_dict = {}
+            for axis, name in enumerate(self.axis_names):
+                roi_dict[f"{name}_start"] = bounds[axis, 0]
+                roi_dict[f"{name}_end"] = bounds[axis, 1]
+            rows.append(roi_dict)
+
+        roi_df = pd.DataFrame(rows, columns=columns)
+        roi_df.index = [self.roi_name(i, tag) for i in range(len(roi_df))]
+
+        out_path = as_output_path(out_path)
+        make_parent_dirs(out_path)
+        roi_df.to_csv(str(out_path), index=True)
+        return out_path
+
+    def plan_crop_export(
+        self,
+        out_path: OutputPath,
+        tag: str,
+        resolution=None,
+        binning=None,
+        reduction: str | None = None,
+        pyramid_levels: int = 1,
+        resume: bool = False,
+        codec: str = DEFAULT_CODEC,
+        codec_level: int = DEFAULT_LEVEL,
+        tuning_target: str = "throughput",
+        max_workers: int = DEFAULT_WRITE_WORKERS,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    ) -> CropExport:
+        """Plan the export of the cropped data of every ROI, slab by slab.
+
+        The format follows the suffix of `out_path`: one OME-Zarr store for
+        ".zarr", or one memory-mapped ".npy" / BigTIFF (".tif", ".tiff") file
+        per ROI, named `<stem>_<roi name><suffix>`. Pyramid levels and codecs
+        only apply to OME-Zarr.
+
+        With a `resolution` (world units per pixel), data is read from the
+        coarsest pyramid level that is at least that fine. `binning` (integer
+        factors) further downsamples the crops with `reduction` ("mean", "max"
+        or "mode"; default "mode" for labels, "mean" otherwise), reading a
+        matching pyramid level if any.
+        Both take a scalar or one value per spatial (z, y, x) axis, which leave
+        leading (time, channel) axes alone, or one value per axis.
+        `pyramid_levels` > 1 also writes 2x downsampled levels of every crop.
+        With `resume`, an existing export at `out_path` is kept: chunks listed in
+        its manifest are verified and only missing or corrupt ones are rewritten.
+        `codec` / `codec_level` select the compressor; codec "auto" tunes codec
+        and chunk shape per ROI for `tuning_target` ("throughput" or "size").
+        `out_path` may also be an fsspec URL (OME-Zarr and CSV only); up to
+        `max_workers` slabs are written concurrently, holding about
+        `memory_budget` bytes of image data at most.
+
+        The ROI bounds are read now; nothing is written until `run()`.
+        """
+        if self.target_layer is None:
+            raise ValueError("No target layer to crop.")
+        transform = self.get_transform()
+        if resolution is not None:
+            resolution = self._per_axis(resolution, np.inf, "Export resolution")
+        level = transform.select_level(resolution)
+        factors = np.ones(transform.ndim, dtype=int)
+        if binning is not None:
+            level, factors = transform.select_binned_level(
+                self._per_axis(binning, 1, "Binning").astype(int), level)
+        if reduction is None:
+            reduction = "mode" if isinstance(self.target_layer, Labels) else "mean"
+        data = self.target_layer.data
+        if getattr(self.target_layer, "multiscale", False):
+            data = data[level]
+
+        bounds = self.get_rois_bounds_px(level=level)
+        # binned voxels sit at the centre of the source voxels they reduce
+        origins = transform.data_to_world(bounds[..., 0] + (factors - 1) / 2, level)
+        crops = [RoiCrop(self.roi_name(i, tag), b, translation=o)
+                 for i, (b, o) in enumerate(zip(bounds, origins, strict=True))]
+        out_path = as_output_path(out_path)
+        out_scale = tuple(transform.level_scale(level) * factors)
+        suffix = path_suffix(out_path)
+        if suffix == ".npy":
+            make_writer = partial(NpyCropWriter, out_path)
+        elif suffix in (".tif", ".tiff"):
+            make_writer = partial(TiffCropWriter, out_path, self.axis_names, out_scale)
+        elif suffix == ".zarr":
+            make_writer = partial(ZarrCropWriter, out_path, self.axis_names, out_scale,
+                                  pyramid_levels=pyramid_levels,
+                                  reduction=reduction,
+                                  resume=resume,
+                                  codec=codec,
+                                  codec_level=codec_level,
+                                  tuning_target=tuning_target)
+        else:
+            raise ValueError(f"Unsupported crop format '{suffix}'.")
+        return CropExport(data, crops, make_writer, out_path,
+                          binning=None if np.all(factors == 1) else factors,
+                          reduction=reduction,
+                          resume=resume,
+                          max_workers=max_workers,
+                          memory_budget=memory_budget)
+
+    def save_crops(self, out_path: OutputPath, tag: str, **options) -> OutputPath:
+        """Export the cropped data of every ROI now; see `plan_crop_export`."""
+        return self.plan_crop_export(out_path, tag, **options).run()
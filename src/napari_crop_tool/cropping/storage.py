@@ -0,0 +1,65 @@
+# cropping/storage.py
+"""Output paths that are either local paths or fsspec URLs."""
+from __future__ import annotations
+
+from pathlib import Path, PurePosixPath
+
+OutputPath = Path | str  # local path, or an fsspec URL such as "s3://bucket/a.zarr"
+
+
+def is_url(path: OutputPath) -> bool:
+    """Whether `path` names an object store or remote filesystem."""
+    return "://" in str(path)
+
+
+def as_output_path(text: OutputPath) -> OutputPath:
+    """Parse a user-entered output location.
+
+    Local paths and file:// URLs become `Path`s (with ~ expanded); other URLs
+    are kept as given.
+    """
+    text = str(text).strip()
+    if text.startswith("file://"):
+        text = text[len("file://"):]
+    return text if is_url(text) else Path(text).expanduser()
+
+
+def get_fs(path: OutputPath):
+    """Fsspec filesystem and store-relative path of a URL."""
+    import fsspec
+
+    return fsspec.core.url_to_fs(str(path))
+
+
+def path_name(path: OutputPath) -> str:
+    """Last component of `path`."""
+    return PurePosixPath(str(path).rstrip("/")).name
+
+
+def path_suffix(path: OutputPath) -> str:
+    """Lower-cased extension of `path`."""
+    return PurePosixPath(str(path).rstrip("/")).suffix.lower()
+
+
+def join_path(path: OutputPath, name: str) -> OutputPath:
+    """`path / name`, keeping URLs as strings."""
+    if is_url(path):
+        return f"{str(path).rstrip('/')}/{name}"
+    return Path(path) / name
+
+
+def path_exists(path: OutputPath) -> bool:
+    """Whether `path` exists, locally or on its object store."""
+    if is_url(path):
+        fs, p = get_fs(path)
+        return fs.exists(p)
+    return Path(path).exists()
+
+
+def make_parent_dirs(path: OutputPath) -> None:
+    """Create the parent directory of `path` (a no-op on object stores)."""
+    if is_url(path):
+        fs, p = get_fs(path)
+        fs.makedirs(str(PurePosixPath(p).parent), exist_ok=True)
+    else:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
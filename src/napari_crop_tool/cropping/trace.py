@@ -0,0 +1,390 @@
+# cropping/trace.py
+"""Recording of cropping sessions and their headless replay for latency."""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .journal import JournalRoi
+
+TRACE_ENV = "NAPARI_CROP_TOOL_TRACE"  # directory to record session traces into
+TRACE_VERSION = 1
+
+
+def _round(verts) -> list:
+    return np.round(np.asarray(verts, dtype=float), 3).tolist()
+
+
+def _roi_records(layer) -> list[dict]:
+    numeric = {k: np.asarray(v, dtype=float) for k, v in layer.properties.items()
+               if np.asarray(v).dtype.kind in "biuf"}
+    return [
+        {"type": str(stype), "verts": _round(verts),
+         "props": {k: float(v[i]) for k, v in numeric.items() if i < len(v)}}
+        for i, (verts, stype) in enumerate(
+            zip(layer.data, layer.shape_type, strict=True))
+    ]
+
+
+def trace_path(directory: Path, layer_key: str) -> Path:
+    """New, timestamped trace file of `layer_key` in `directory`."""
+    return Path(directory) / f"{layer_key}-{time.strftime('%Y%m%d-%H%M%S')}.trace.jsonl"
+
+
+class TraceRecorder:
+    """Compact JSON-lines trace of one cropping session.
+
+    The first line describes the target layer, the dims position and the ROIs
+    present when recording started; every following line is one controller
+    action, dims change or shapes edit, stamped with seconds since the start.
+    """
+
+    def __init__(self, path: Path):
+        """Nothing is written until `start`."""
+        self.path = Path(path)
+        self._fh = None
+        self._t0 = 0.0
+
+    def start(self, model) -> None:
+        """Open the trace and write the header describing `model`."""
+        layer = model.target_layer
+        level_shapes = getattr(layer, "level_shapes", None)
+        shape = (level_shapes[0] if level_shapes is not None and len(level_shapes)
+                 else np.shape(layer.data))
+        header = {
+            "type": "header",
+            "version": TRACE_VERSION,
+            "shape": [int(s) for s in shape],
+            "dtype": str(np.dtype(layer.dtype)),
+            "scale": [float(s) for s in model.scale],
+            "axis_names": list(model.axis_names),
+            "step": [int(s) for s in model.viewer.dims.current_step],
+            "rois": _roi_records(model.shapes_layer),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "w")
+        self._write(header)
+        self._t0 = time.perf_counter()
+
+    def _write(self, entry: dict):
+        self._fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._fh.flush()
+
+    def record(self, kind: str, name: str, **args) -> None:
+        """Append one timestamped event (a no-op before `start`)."""
+        if self._fh is None:
+            return
+        self._write({"t": round(time.perf_counter() - self._t0, 4),
+                     "k": kind, "n": name, **args})
+
+    def record_shapes(self, layer, event, n_before: int) -> None:
+        """Record a napari shapes data event (user draw, edit or delete).
+
+        `n_before` is the ROI count before the event.
+        """
+        if self._fh is None:
+            return
+        action = str(getattr(event.action, "value", event.action))
+        if action == "added":
+            n_new = len(layer.data) - n_before
+            if n_new <= 0:
+                return
+            self.record("shapes", action,
+                        verts=[_round(v) for v in layer.data[-n_new:]],
+                        types=[str(t) for t in layer.shape_type[-n_new:]])
+        elif action == "changed":
+            indices = [int(i) for i in event.data_indices if 0 <= i < len(layer.data)]
+            self.record("shapes", action, idx=indices,
+                        verts=[_round(layer.data[i]) for i in indices])
+        elif action == "removed":
+            self.record("shapes", action, idx=[int(i) for i in event.data_indices])
+
+    def close(self) -> None:
+        """Close the trace file."""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def read_trace(path: Path) -> tuple[dict, list[dict]]:
+    """Header and events of a trace; a torn last line is dropped."""
+    lines = Path(path).read_text().splitlines()
+    header = json.loads(lines[0]) if lines else {}
+    if header.get("type") != "header" or header.get("version") != TRACE_VERSION:
+        raise ValueError(f"'{path}' is not a crop tool trace.")
+    events = []
+    for line in lines[1:]:
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError:
+            break
+    return header, events
+
+
+def synthetic_rois(header: dict, n: int, seed: int = 0) -> list[np.ndarray]:
+    """`n` reproducible rectangles spread over the y/x plane of the traced layer.
+
+    They lie at the dims position the layer had when recording started.
+    """
+    rng = np.random.default_rng(seed)
+    scale = np.array(header["scale"], dtype=float)
+    extent = np.array(header["shape"], dtype=float) * scale
+    point = np.array(header["step"], dtype=float) * scale
+    size = extent[-2:] * rng.uniform(0.02, 0.1, (n, 2))
+    origin = rng.uniform(0, 1, (n, 2)) * (extent[-2:] - size)
+    rois = []
+    for (y0, x0), (h, w) in zip(origin, size, strict=True):
+        verts = np.tile(point, (4, 1))
+        verts[:, -2:] = [[y0, x0], [y0, x0 + w], [y0 + h, x0 + w], [y0 + h, x0]]
+        rois.append(verts)
+    return rois
+
+
+@dataclass
+class ReplayStep:
+    """Wall time of one replayed event."""
+    kind: str
+    name: str
+    seconds: float
+
+
+@dataclass
+class ReplayReport:
+    """Every replayed step of a trace."""
+    n_rois: int  # ROIs present before the first step
+    steps: list[ReplayStep] = field(default_factory=list)
+    rendered: bool = False  # steps include drawing a frame of the canvas
+
+    def summary(self) -> dict[str, dict]:
+        """Latency statistics (ms) per step type, e.g. "action:set_start"."""
+        by_name: dict[str, list[float]] = {}
+        for step in self.steps:
+            by_name.setdefault(f"{step.kind}:{step.name}", []).append(step.seconds)
+        stats = {}
+        for name, seconds in by_name.items():
+            ms = np.array(seconds) * 1e3
+            stats[name] = {"count": len(ms), "mean": float(ms.mean()),
+                           "p50": float(np.percentile(ms, 50)),
+                           "p95": float(np.percentile(ms, 95)),
+                           "max": float(ms.max())}
+        return stats
+
+    def format(self) -> str:
+        """Table of `summary`, one row per step type."""
+        total = sum(s.seconds for s in self.steps)
+        drawing = ("canvas drawn after every step" if self.rendered
+                   else "no OpenGL canvas: draw time NOT included")
+        lines = [f"{len(self.steps)} steps, {self.n_rois} ROIs, {total:.3f} s total "
+                 f"({drawing})",
+                 f"{'step':<28}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}"]
+        for name, s in sorted(self.summary().items()):
+            lines.append(f"{name:<28}{s['count']:>7}{s['mean']:>10.2f}"
+                         f"{s['p50']:>10.2f}{s['p95']:>10.2f}{s['max']:>10.2f}")
+        return "\n".join(lines)
+
+
+def _make_viewer(header: dict, render: bool):
+    """Viewer showing a placeholder image of the traced shape.
+
+    The viewer has an offscreen canvas when `render` is set and OpenGL is
+    available; the last value tells whether frames can be drawn.
+    """
+    import napari
+    from napari.components import ViewerModel
+
+    # zero-strided placeholder: the layer has the traced shape but no memory
+    image = np.broadcast_to(np.zeros(1, dtype=header["dtype"]), tuple(header["shape"]))
+    if render:
+        viewer = napari.Viewer(show=False)
+        try:
+            layer = viewer.add_image(image, scale=header["scale"])
+            viewer.screenshot(canvas_only=True, flash=False)
+            return viewer, layer, True
+        except Exception:
+            # no usable OpenGL context (e.g. a headless machine); the canvas
+            # never registered the layer, so closing may fail too
+            with contextlib.suppress(Exception):
+                viewer.close()
+    viewer = ViewerModel()
+    return viewer, viewer.add_image(image, scale=header["scale"]), False
+
+
+def _build_session(header: dict, n_rois: int, seed: int, render: bool = True):
+    """Viewer, placeholder image and cropping controller of the traced session."""
+    from qtpy.QtWidgets import QApplication
+
+    from napari_crop_tool._utils import _get_axis_names, _get_roi_properties
+
+    from .controller import CroppingController
+    from .gui import CroppingGUIQt
+    from .model import CroppingModel
+
+    app = QApplication.instance() or QApplication([])
+    ndim = len(header["shape"])
+    viewer, image, rendered = _make_viewer(header, render)
+    if len(header["axis_names"]) == ndim:
+        viewer.dims.axis_labels = tuple(header["axis_names"])
+    axis_names = _get_axis_names(viewer.dims.axis_labels, ndim)
+    shapes = viewer.add_shapes(ndim=ndim, name="Cropping ToolBox",
+                               properties=_get_roi_properties(ndim, axis_names))
+    viewer.dims.current_step = tuple(header["step"])
+
+    gui = CroppingGUIQt()
+    gui.set_cropping_enabled(True)
+    model = CroppingModel(viewer=viewer, shapes_layer=shapes,
+                          scale=tuple(header["scale"]), out_dir=Path.cwd(),
+                          target_layer=image)
+    gui.set_range_axes([model.axis_names[a] for a in model.range_axes])
+    model.restore_rois([JournalRoi(r["type"], np.array(r["verts"]), r["props"])
+                        for r in header["rois"]])
+    controller = CroppingController(model, gui)
+    if n_rois:
+        shapes.add_rectangles(synthetic_rois(header, n_rois, seed))
+    controller._set_selected_roi(None)
+    app.processEvents()
+    return app, controller, rendered
+
+
+class _IndexMap:
+    """Replay index of every ROI of the traced session.
+
+    Kept in step as ROIs are drawn, deleted and cleared (synthetic ROIs have no
+    trace index).
+    """
+
+    def __init__(self, n_initial: int):
+        # synthetic ROIs are added right after the ones the trace started with
+        self.replay = list(range(n_initial))
+
+    def __call__(self, idx: int) -> int:
+        if not 0 <= idx < len(self.replay):
+            raise ValueError(f"Trace refers to ROI {idx}, which is not present.")
+        return self.replay[idx]
+
+    def added(self, first: int, count: int) -> None:
+        self.replay.extend(range(first, first + count))
+
+    def removed(self, replay_indices) -> None:
+        for r in sorted(set(replay_indices), reverse=True):
+            self.replay = [x - (x > r) for x in self.replay if x != r]
+
+    def cleared(self) -> None:
+        self.replay = []
+
+
+def _apply(controller, event: dict, remap: _IndexMap) -> None:
+    from napari.layers.base._base_constants import ActionType
+
+    kind, name = event["k"], event["n"]
+    model, gui = controller.model, controller.gui
+    layer = model.shapes_layer
+    if kind == "dims":
+        model.viewer.dims.current_step = tuple(event["step"])
+    elif kind == "select":
+        layer.selected_data = {remap(event["idx"])}
+    elif kind == "shapes" and name == "added":
+        first = model.num_rois()
+        layer.add([np.array(v) for v in event["verts"]], shape_type=event["types"])
+        remap.added(first, len(event["verts"]))
+    elif kind == "shapes" and name == "changed":
+        # edit the shapes one by one, as napari's own drag / resize does;
+        # assigning `layer.data` would re-triangulate every ROI
+        indices = [remap(i) for i in event["idx"]]
+        for i, verts in zip(indices, event["verts"], strict=True):
+            layer._data_view.edit(i, np.array(verts))
+        layer.refresh()
+        layer.events.data(
+            value=layer.data,
+            action=ActionType.CHANGED,
+            data_indices=tuple(indices),
+            vertex_indices=tuple(tuple(range(len(v))) for v in event["verts"]),
+        )
+    elif kind == "shapes" and name == "removed":
+        indices = [remap(i) for i in event["idx"]]
+        layer.selected_data = set(indices)
+        layer.remove_selected()
+        remap.removed(indices)
+    elif kind == "action":
+        if "sel" in event and name != "list_select":
+            controller._set_selected_roi(remap(event["sel"]))
+        if "row" in event and name.startswith("set_range"):
+            gui.cmb_range_axis.setCurrentIndex(event["row"])
+        if name == "set_size":
+            gui.txt_size_x.setText(event["size"][0])
+            gui.txt_size_y.setText(event["size"][1])
+        handlers = {
+            "set_start": controller.on_set_start,
+            "set_stop": controller.on_set_stop,
+            "set_range_start": controller.on_set_range_start,
+            "set_range_stop": controller.on_set_range_stop,
+            "set_size": controller.on_set_rectangle_size,
+            "delete": controller.on_delete_selected,
+            "clear": controller.on_clear_rois,
+            "list_select": lambda: controller.on_roi_selected_from_list(
+                remap(event["row"])),
+        }
+        selected, n_before = controller.selected_roi_idx, model.num_rois()
+        handlers[name]()
+        if name == "clear":
+            remap.cleared()
+        elif name == "delete" and model.num_rois() < n_before:
+            remap.removed([selected])
+
+
+def replay_trace(path: Path, n_rois: int = 0, seed: int = 0,
+                 render: bool = True) -> ReplayReport:
+    """Replay a recorded trace headlessly, timing every step.
+
+    `n_rois` synthetic rectangles are added after the ROIs the trace started
+    with; recorded ROI indices are mapped to the matching replay ROIs as ROIs
+    are drawn and deleted. Each step is timed until the Qt event queue is
+    drained and, with `render` and an OpenGL context, a frame is drawn on an
+    offscreen canvas.
+    """
+    header, events = read_trace(path)
+    app, controller, rendered = _build_session(header, n_rois, seed, render)
+    viewer = controller.model.viewer
+    remap = _IndexMap(len(header["rois"]))
+
+    report = ReplayReport(n_rois=controller.model.num_rois(), rendered=rendered)
+    for event in events:
+        start = time.perf_counter()
+        _apply(controller, event, remap)
+        app.processEvents()
+        if rendered:
+            viewer.screenshot(canvas_only=True, flash=False)
+        report.steps.append(
+            ReplayStep(event["k"], event["n"], time.perf_counter() - start))
+    viewer.layers.clear()
+    if rendered:
+        viewer.close()
+    controller.gui.deleteLater()
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command-line entry point of `python -m napari_crop_tool.cropping.trace`."""
+    parser = argparse.ArgumentParser(
+        description="Replay a napari-crop-tool session trace and report "
+                    "per-step latency.")
+    parser.add_argument("trace", type=Path)
+    parser.add_argument("--rois", type=int, default=0,
+                        help="synthetic ROIs added before replaying")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-render", action="store_true",
+                        help="replay without a canvas (excludes draw time)")
+    args = parser.parse_args(argv)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    print(replay_trace(args.trace, n_rois=args.rois, seed=args.seed,
+                       render=not args.no_render).format())
+
+
+if __name__ == "__main__":
+    main()
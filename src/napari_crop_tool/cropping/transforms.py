@@ -0,0 +1,167 @@
+# cropping/transforms.py
+"""Cached world <-> data coordinate mapping of (multiscale) layers."""
+from __future__ import annotations
+
+import itertools
+from typing import TYPE_CHECKING
+
+import numpy as np
+from napari.utils.transforms import Affine
+
+if TYPE_CHECKING:
+    from napari.layers import Layer
+
+_TRANSFORM_EVENTS = ("scale", "translate", "rotate", "shear", "affine")
+
+
+class CoordinateTransform:
+    """Vectorised world <-> data mapping of one layer, for every pyramid level.
+
+    Level `l` data coordinates relate to level 0 through the layer's downsample
+    factors, so every level shares the same level-0 data-to-world matrix.
+    """
+
+    def __init__(
+        self,
+        data_to_world: np.ndarray,
+        level_shapes: np.ndarray,
+        downsample_factors: np.ndarray,
+    ):
+        """`data_to_world` is the homogeneous matrix of level 0."""
+        self.matrix = np.asarray(data_to_world, dtype=float)
+        self.ndim = self.matrix.shape[0] - 1
+        self.level_shapes = np.asarray(level_shapes, dtype=int).reshape(-1, self.ndim)
+        self.downsample_factors = (np.asarray(downsample_factors, dtype=float)
+                                   .reshape(-1, self.ndim))
+        self._to_world: dict[int, np.ndarray] = {}
+        self._to_data: dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_layer(cls, layer: Layer) -> CoordinateTransform:
+        """Transform of `layer` as it is placed in the world right now."""
+        physical = Affine(
+            scale=layer.scale,
+            translate=layer.translate,
+            rotate=layer.rotate,
+            shear=layer.shear,
+        )
+        matrix = np.asarray(layer.affine.affine_matrix) @ physical.affine_matrix
+        level_shapes = getattr(layer, "level_shapes", None)
+        if level_shapes is None:
+            level_shapes = [np.shape(layer.data)]
+        downsample = getattr(layer, "downsample_factors", None)
+        if downsample is None:
+            downsample = np.ones((1, layer.ndim))
+        return cls(matrix, level_shapes, downsample)
+
+    @property
+    def n_levels(self) -> int:
+        """Number of pyramid levels."""
+        return len(self.level_shapes)
+
+    def level_to_world_matrix(self, level: int = 0) -> np.ndarray:
+        """Homogeneous matrix from `level` data coordinates to world."""
+        if level not in self._to_world:
+            ds = np.append(self.downsample_factors[level], 1.0)
+            self._to_world[level] = self.matrix * ds[None, :]
+        return self._to_world[level]
+
+    def world_to_level_matrix(self, level: int = 0) -> np.ndarray:
+        """Homogeneous matrix from world to `level` data coordinates."""
+        if level not in self._to_data:
+            self._to_data[level] = np.linalg.inv(self.level_to_world_matrix(level))
+        return self._to_data[level]
+
+    def level_scale(self, level: int = 0) -> np.ndarray:
+        """World size of one pixel along each data axis at `level`."""
+        linear = self.level_to_world_matrix(level)[:-1, :-1]
+        return np.linalg.norm(linear, axis=0)
+
+    @staticmethod
+    def _apply(matrix: np.ndarray, points: np.ndarray) -> np.ndarray:
+        points = np.asarray(points, dtype=float)
+        return points @ matrix[:-1, :-1].T + matrix[:-1, -1]
+
+    def world_to_data(self, points: np.ndarray, level: int = 0) -> np.ndarray:
+        """Map (..., ndim) world points to data coordinates of `level`."""
+        return self._apply(self.world_to_level_matrix(level), points)
+
+    def data_to_world(self, points: np.ndarray, level: int = 0) -> np.ndarray:
+        """Map (..., ndim) data coordinates of `level` to world points."""
+        return self._apply(self.level_to_world_matrix(level), points)
+
+    def _map_boxes(self, boxes: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        boxes = np.asarray(boxes, dtype=float)
+        ndim = boxes.shape[1]
+        # all 2**ndim corners of every box, transformed in a single matmul
+        choice = np.array(list(itertools.product((0, 1), repeat=ndim)))
+        corners = boxes[:, np.arange(ndim), choice]  # (n, 2**ndim, ndim)
+        mapped = self._apply(matrix, corners)
+        return np.stack([mapped.min(axis=1), mapped.max(axis=1)], axis=-1)
+
+    def boxes_world_to_data(self, boxes: np.ndarray, level: int = 0) -> np.ndarray:
+        """Map (n, ndim, 2) world boxes to their (n, ndim, 2) data bounding boxes."""
+        return self._map_boxes(boxes, self.world_to_level_matrix(level))
+
+    def boxes_data_to_world(self, boxes: np.ndarray, level: int = 0) -> np.ndarray:
+        """Map (n, ndim, 2) data boxes of `level` to (n, ndim, 2) world boxes."""
+        return self._map_boxes(boxes, self.level_to_world_matrix(level))
+
+    def select_level(self, resolution=None) -> int:
+        """Coarsest pyramid level whose pixels are no larger than `resolution`.
+
+        `resolution` is a world size per pixel, either one value for all axes or
+        one per axis; None (or nothing coarse enough) selects level 0.
+        """
+        if resolution is None:
+            return 0
+        target = np.broadcast_to(np.asarray(resolution, dtype=float), (self.ndim,))
+        best = 0
+        for level in range(1, self.n_levels):
+            if np.all(self.level_scale(level) <= target * (1 + 1e-6)):
+                best = level
+        return best
+
+    def select_binned_level(
+        self, binning, base_level: int = 0
+    ) -> tuple[int, np.ndarray]:
+        """Coarsest level that bins `base_level` by a divisor of `binning`.
+
+        Returns the level and the integer binning still to apply on top of it,
+        e.g. 4x binning over a pyramid with a 2x level reads that level and
+        bins it by 2.
+        """
+        factors = np.broadcast_to(np.asarray(binning, dtype=int), (self.ndim,))
+        base = self.downsample_factors[base_level]
+        best, best_rel = base_level, np.ones(self.ndim, dtype=int)
+        for level in range(base_level + 1, self.n_levels):
+            rel = self.downsample_factors[level] / base
+            rel_int = np.round(rel).astype(int)
+            if (np.allclose(rel, rel_int) and np.all(rel_int >= 1)
+                    and np.all(factors % rel_int == 0)
+                    and rel_int.prod() > best_rel.prod()):
+                best, best_rel = level, rel_int
+        return best, factors // best_rel
+
+
+class LayerTransformCache:
+    """Lazily built `CoordinateTransform` of a layer, reset on transform change."""
+
+    def __init__(self, layer: Layer):
+        """Listens to the transform events of `layer`."""
+        self.layer = layer
+        self._transform: CoordinateTransform | None = None
+        for name in _TRANSFORM_EVENTS:
+            emitter = getattr(layer.events, name, None)
+            if emitter is not None:
+                emitter.connect(self.invalidate)
+
+    def invalidate(self, event=None):
+        """Drop the cached transform."""
+        self._transform = None
+
+    def get(self) -> CoordinateTransform:
+        """The transform of the layer, rebuilt if it moved since the last call."""
+        if self._transform is None:
+            self._transform = CoordinateTransform.from_layer(self.layer)
+        return self._transform
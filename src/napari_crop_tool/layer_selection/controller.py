@@ -1,18 +1,23 @@
 # layer_selection/controller.py
 from __future__ import annotations
 
+import os
 from pathlib import Path
-import numpy as np
+from qtpy.QtWidgets import QMessageBox
 from napari import Viewer
 from napari.layers import Layer, Image, Labels
 
 from .model import LayerSelectionModel
 from .gui import LayerSelectionGUIQt
-from .._utils import _get_scale_from_layer
+from .._utils import (
+    _get_scale_from_layer, _get_layer_key, _get_axis_names, _get_roi_properties
+)
 
 from ..cropping.model import CroppingModel
 from ..cropping.gui import CroppingGUIQt
 from ..cropping.controller import CroppingController
+from ..cropping.journal import RoiJournal, journal_path
+from ..cropping.trace import TRACE_ENV, TraceRecorder, trace_path
 
 class LayerSelectionControllerQt():
 
@@ -23,6 +28,8 @@ class LayerSelectionControllerQt():
 
         self.cropping_gui = CroppingGUIQt()
         self.cropping_controller: CroppingController | None = None
+        self.journal: RoiJournal | None = None
+        self.recorder: TraceRecorder | None = None
 
         # GUI events
         self.layer_gui.btn_confirm.clicked.connect(self.on_confirm)
@@ -91,14 +98,8 @@ class LayerSelectionControllerQt():
         layer = self.model.target_layer
 
         # Create shapes layer tailored to dimensionality
-        props = (
-            {"track_axis": np.array([], dtype=int),
-            "start_idx": np.array([], dtype=float), 
-            "end_idx": np.array([], dtype=float), 
-            "id": np.array([], dtype=str)}
-            if layer.ndim > 2
-            else {"id": np.array([], dtype=str)}
-        )
+        axis_names = _get_axis_names(self.model.viewer.dims.axis_labels, layer.ndim)
+        props = _get_roi_properties(layer.ndim, axis_names)
         self.model.shapes_layer = self.model.viewer.add_shapes(
             ndim=layer.ndim,
             name="Cropping ToolBox",
@@ -117,14 +118,55 @@ class LayerSelectionControllerQt():
             shapes_layer=self.model.shapes_layer,
             scale=scale,
             out_dir=out_dir,
+            target_layer=layer,
         )
+        self.cropping_gui.set_range_axes(
+            [cropping_model.axis_names[a] for a in cropping_model.range_axes])
+
+        # Restore the autosaved session of this layer, if any
+        self.journal = RoiJournal(journal_path(_get_layer_key(layer)))
+        restored = self.journal.read()
+        if restored and not self._confirm_restore(layer, len(restored)):
+            restored = []
+        cropping_model.restore_rois(restored)
+        self.journal.start(restored)
+
+        # Record an interaction trace for `trace.py` replay when requested
+        trace_dir = os.environ.get(TRACE_ENV)
+        if trace_dir:
+            self.recorder = TraceRecorder(trace_path(trace_dir, _get_layer_key(layer)))
+            self.recorder.start(cropping_model)
+
         self.cropping_controller = CroppingController(
             cropping_model, 
-            self.cropping_gui)
+            self.cropping_gui,
+            journal=self.journal,
+            recorder=self.recorder)
+
+    def _confirm_restore(self, layer: Layer, n_rois: int) -> bool:
+        reply = QMessageBox.question(
+            self.layer_gui,
+            "Restore session?",
+            f"An autosaved session with {n_rois} ROI(s) was found for layer "
+            f"'{layer.name}'.\n\nDo you want to restore it?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.Yes,
+        )
+        return reply == QMessageBox.Yes
 
     def _exit_cropping_session(self):
+        if self.cropping_controller is not None:
+            self.cropping_controller.cancel_export()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
         self.cropping_gui.set_cropping_enabled(False)
         self.cropping_gui.clear_roi_labels()
+        self.cropping_gui.set_range_axes([])
 
         self.model.remove_shapes_if_any()
         self.model.clear_session_state()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from napari_crop_tool.cropping.export import _mode_rows, bin_block
+
+
+def test_mode_rows_picks_smallest_value_on_ties():
+    values = np.array([[3, 1, 3, 1],
+                       [5, 5, 2, 7],
+                       [9, 8, 7, 6],
+                       [4, 4, 4, 4]])
+    np.testing.assert_array_equal(_mode_rows(values), [1, 5, 6, 4])
+
+
+def test_unit_factors_return_the_block_unchanged():
+    block = np.arange(24).reshape(2, 3, 4)
+    assert bin_block(block, (1, 1, 1)) is block
+
+
+@pytest.mark.parametrize("reduction", ["mean", "max", "mode"])
+def test_trailing_partial_bins_are_edge_padded(reduction):
+    block = np.arange(5 * 7, dtype=np.float64).reshape(5, 7)
+    padded = np.pad(block, ((0, 1), (0, 2)), mode="edge")
+
+    out = bin_block(block, (2, 3), reduction)
+
+    assert out.shape == (3, 3)
+    np.testing.assert_array_equal(out, bin_block(padded, (2, 3), reduction))
+    # the last bin only holds copies of the last voxel
+    assert out[-1, -1] == block[4, 6]
+
+
+def test_integer_mean_is_rounded_to_the_input_dtype():
+    block = np.array([[0, 1], [1, 1], [250, 255], [255, 255]], dtype=np.uint8)
+
+    out = bin_block(block, (2, 2), "mean")
+
+    assert out.dtype == np.uint8
+    # 0.75 rounds up, 253.75 rounds up without overflowing
+    np.testing.assert_array_equal(out, [[1], [254]])
+
+
+def test_mode_keeps_label_values():
+    labels = np.array([[7, 7, 2, 3],
+                       [7, 2, 3, 2],
+                       [0, 0, 5, 5],
+                       [1, 1, 5, 6]], dtype=np.uint16)
+
+    out = bin_block(labels, (2, 2), "mode")
+
+    assert out.dtype == np.uint16
+    # a tie (0 and 1 twice each) resolves to the smallest label
+    np.testing.assert_array_equal(out, [[7, 2], [0, 5]])
+
+
+def test_max_and_unknown_reduction():
+    block = np.arange(16).reshape(4, 4)
+    np.testing.assert_array_equal(bin_block(block, (2, 4), "max"), [[7], [15]])
+    with pytest.raises(ValueError, match="Unknown reduction"):
+        bin_block(block, (2, 2), "median")
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from napari_crop_tool.cropping.journal import (
+    _FILE_HEADER,
+    _MAGIC,
+    _VERSION,
+    JournalRoi,
+    RoiJournal,
+    _diff,
+    _encode_snapshot,
+    _replay,
+)
+
+
+def _roi(i, shape_type="rectangle"):
+    verts = np.array([[i, 0, 0], [i, 0, 5], [i, 5, 5], [i, 5, 0]], dtype=float)
+    props = {"start_idx": float(i), "end_idx": i + 3.0}
+    return JournalRoi(shape_type, verts + i, props)
+
+
+def _journal(old, new):
+    return (_FILE_HEADER.pack(_MAGIC, _VERSION) + _encode_snapshot(old)
+            + b"".join(_diff(old, new)))
+
+
+def _assert_same(rois, expected):
+    assert len(rois) == len(expected)
+    for roi, exp in zip(rois, expected, strict=True):
+        assert roi.same_as(exp)
+
+
+@pytest.mark.parametrize(
+    "edit",
+    [
+        lambda rois: [*rois, _roi(10), _roi(11)],  # append
+        lambda rois: rois[:2] + rois[3:],  # delete in the middle
+        lambda rois: rois[1:],  # delete the first
+        lambda rois: [*rois[:2], _roi(20, "ellipse"), *rois[3:]],  # middle edit
+        lambda rois: [rois[0], _roi(21), *rois[2:4], _roi(22)],  # scattered
+        lambda rois: [*rois[:2], _roi(23), *rois[2:]],  # insert
+        lambda rois: [],  # clear
+    ],
+)
+def test_diff_then_replay_rebuilds_new(edit):
+    old = [_roi(i) for i in range(5)]
+    new = edit(old)
+    _assert_same(_replay(_journal(old, new)), new)
+
+
+def test_diff_of_a_single_edit_is_one_record():
+    old = [_roi(i) for i in range(50)]
+    new = list(old)
+    new[10], new[40] = _roi(60), _roi(61)
+    assert len(_diff(old, new)) == 2
+    assert _diff(old, list(old)) == []
+
+
+def test_replay_stops_at_truncated_last_record():
+    old = [_roi(i) for i in range(3)]
+    new = [*old, _roi(3)]
+    buf = _journal(old, new)
+    for cut in (1, 10, len(_diff(old, new)[0]) - 1):
+        _assert_same(_replay(buf[:-cut]), old)
+
+
+def test_replay_stops_at_corrupt_last_record():
+    old = [_roi(i) for i in range(3)]
+    buf = bytearray(_journal(old, [*old, _roi(3)]))
+    buf[-2] ^= 0xFF
+    _assert_same(_replay(bytes(buf)), old)
+
+
+def test_replay_rejects_foreign_files():
+    assert _replay(b"") == []
+    assert _replay(b"not a journal at all") == []
+
+
+def _features(rois):
+    return pd.DataFrame({
+        "id": [str(i) for i in range(len(rois))],
+        "start_idx": [r.properties["start_idx"] for r in rois],
+        "end_idx": [r.properties["end_idx"] for r in rois],
+    })
+
+
+def _record(journal, rois, **kwargs):
+    journal.record([r.vertices for r in rois], [r.shape_type for r in rois],
+                   _features(rois), **kwargs)
+
+
+def test_journal_round_trip(tmp_path):
+    path = tmp_path / "session.roij"
+    initial = [_roi(i) for i in range(3)]
+    journal = RoiJournal(path, snapshot_every=4)
+    journal.start(initial)
+    rois = list(initial)
+    for i in range(3, 9):  # enough records to compact in between
+        rois.append(_roi(i))
+        _record(journal, rois, changed=[len(rois) - 1])
+    del rois[1]
+    _record(journal, rois, changed=[], removed=[1])
+    rois[2] = _roi(30, "polygon")
+    _record(journal, rois, changed=[2])
+    journal.close()
+
+    _assert_same(RoiJournal(path).read(), rois)
+
+
+def test_journal_write_error_stops_recording(tmp_path, monkeypatch):
+    journal = RoiJournal(tmp_path / "session.roij")
+
+    def fail(rois):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(journal, "_write", fail)
+    journal.start([])
+    _record(journal, [_roi(0)])
+    journal._thread.join(timeout=5)
+
+    assert isinstance(journal.error, OSError)
+    _record(journal, [_roi(0), _roi(1)])
+    assert journal._queue.empty()
+    assert journal.pop_error() is journal.error
+    assert journal.pop_error() is None
+    journal.close()
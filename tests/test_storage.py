@@ -0,0 +1,178 @@
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+zarr = pytest.importorskip("zarr")
+fsspec = pytest.importorskip("fsspec")
+pytest.importorskip("napari")
+
+from napari.components import ViewerModel  # noqa: E402
+
+from napari_crop_tool._utils import _get_roi_properties  # noqa: E402
+from napari_crop_tool.cropping import export  # noqa: E402
+from napari_crop_tool.cropping.model import CroppingModel  # noqa: E402
+
+
+def _rect(z, y0, x0, y1, x1):
+    return [[z, y0, x0], [z, y0, x1], [z, y1, x1], [z, y1, x0]]
+
+
+@pytest.fixture
+def model():
+    viewer = ViewerModel()
+    data = (np.arange(40 * 60 * 70) % 251).astype(np.uint16).reshape(40, 60, 70)
+    image = viewer.add_image(data)
+    shapes = viewer.add_shapes(
+        ndim=3, properties=_get_roi_properties(3, ("z", "y", "x"))
+    )
+    shapes.add_rectangles([_rect(0, 3, 3, 50, 60), _rect(0, 10, 10, 20, 20)])
+    shapes.properties = {
+        "id": np.array(["0", "1"]),
+        "track_axis": np.array([0.0, 0.0]),
+        "start_idx": np.array([2.0, 5.0]),
+        "end_idx": np.array([37.0, 9.0]),
+    }
+    return CroppingModel(
+        viewer=viewer,
+        shapes_layer=shapes,
+        scale=(1, 1, 1),
+        out_dir=Path.cwd(),
+        target_layer=image,
+    )
+
+
+@pytest.fixture
+def memory_url():
+    url = f"memory://crop-tool-tests/{uuid.uuid4().hex}/crops.zarr"
+    yield url
+    fs = fsspec.filesystem("memory")
+    fs.rm(url[len("memory://"):], recursive=True)
+
+
+def _expected(model):
+    image = model.target_layer.data
+    return [
+        image[tuple(slice(int(a), int(b)) for a, b in bounds)]
+        for bounds in model.get_rois_bounds_px()
+    ]
+
+
+def _assert_crops(url, model):
+    root = zarr.open_group(url, mode="r")
+    for i, expected in enumerate(_expected(model)):
+        np.testing.assert_array_equal(root[f"t_roi_{i:02}/0"][:], expected)
+
+
+def test_export_to_memory_url(model, memory_url):
+    assert not model.crop_output_exists(memory_url, "t")
+    saved = model.save_crops(memory_url, "t", pyramid_levels=2, max_workers=4)
+
+    assert saved == memory_url
+    assert model.crop_output_exists(memory_url, "t")
+    _assert_crops(memory_url, model)
+    root = zarr.open_group(memory_url, mode="r")
+    assert len(root["t_roi_00"].attrs["multiscales"][0]["datasets"]) == 2
+
+
+def test_resume_on_memory_url(model, memory_url, monkeypatch):
+    model.save_crops(memory_url, "t", max_workers=4)
+
+    writes = []
+    original = export.ZarrCropWriter.write
+
+    def counting(self, target, region, block):
+        writes.append(export.region_key(region))
+        return original(self, target, region, block)
+
+    monkeypatch.setattr(export.ZarrCropWriter, "write", counting)
+    model.save_crops(memory_url, "t", resume=True, max_workers=4)
+    assert writes == []
+
+    # drop one chunk: only its slab is exported again
+    fs = fsspec.filesystem("memory")
+    root = memory_url[len("memory://"):]
+    fs.rm(f"{root}/t_roi_00/0/0.0.0")
+    model.save_crops(memory_url, "t", resume=True, max_workers=4)
+    assert writes == ["0,0,0"]
+    _assert_crops(memory_url, model)
+
+
+def test_export_to_file_url(model, tmp_path):
+    url = f"file://{tmp_path}/nested/crops.zarr"
+    saved = model.save_crops(url, "t", max_workers=2)
+
+    assert saved == tmp_path / "nested" / "crops.zarr"
+    assert (tmp_path / "nested" / "crops.zarr" / "crop_manifest.jsonl").exists()
+    _assert_crops(str(saved), model)
+
+
+def test_concurrent_writes_match_sequential(model, tmp_path):
+    sequential = model.save_crops(tmp_path / "seq.zarr", "t",
+                                  pyramid_levels=3, max_workers=1)
+    concurrent = model.save_crops(tmp_path / "par.zarr", "t",
+                                  pyramid_levels=3, max_workers=8)
+
+    seq = zarr.open_group(str(sequential), mode="r")
+    par = zarr.open_group(str(concurrent), mode="r")
+    for name in ("t_roi_00", "t_roi_01"):
+        levels = seq[name].attrs["multiscales"][0]["datasets"]
+        assert levels == par[name].attrs["multiscales"][0]["datasets"]
+        for level in levels:
+            np.testing.assert_array_equal(seq[f"{name}/{level['path']}"][:],
+                                          par[f"{name}/{level['path']}"][:])
+
+
+def test_slabs_split_along_the_chunk_grid_within_budget():
+    shape, chunks = (40, 60, 70), (32, 16, 16)
+    slabs = list(export.iter_slabs(shape, chunks, max_items=32 * 16 * 40))
+
+    covered = np.zeros(shape, dtype=int)
+    for region in slabs:
+        covered[region] += 1
+        assert np.prod([r.stop - r.start for r in region]) <= 32 * 16 * 40
+        assert all(r.start % c == 0 for r, c in zip(region, chunks, strict=True))
+    assert np.all(covered == 1)
+    assert list(export.iter_slabs(shape, chunks)) == [
+        (slice(0, 32), slice(0, 60), slice(0, 70)),
+        (slice(32, 40), slice(0, 60), slice(0, 70)),
+    ]
+
+
+def test_small_memory_budget_matches_default(model, tmp_path, monkeypatch):
+    sizes = []
+    original = export.ZarrCropWriter.write
+
+    def recording(self, target, region, block):
+        sizes.append(block.nbytes)
+        return original(self, target, region, block)
+
+    monkeypatch.setattr(export.ZarrCropWriter, "write", recording)
+    # chunks smaller than the crop planes, so slabs can be split along y/x
+    monkeypatch.setattr(export, "default_chunks", lambda shape: (8, 16, 16))
+    default = model.save_crops(tmp_path / "default.zarr", "t", pyramid_levels=3)
+    n_default = len(sizes)
+    sizes.clear()
+    small = model.save_crops(tmp_path / "small.zarr", "t", pyramid_levels=3,
+                             max_workers=2, memory_budget=64 * 1024)
+
+    # 2 workers with 2 slabs each, holding the read and the written block
+    assert len(sizes) > n_default
+    assert max(sizes) <= 64 * 1024 // (2 * 2 * 2)
+    ref = zarr.open_group(str(default), mode="r")
+    out = zarr.open_group(str(small), mode="r")
+    for name in ("t_roi_00", "t_roi_01"):
+        for level in ref[name].attrs["multiscales"][0]["datasets"]:
+            path = f"{name}/{level['path']}"
+            np.testing.assert_array_equal(ref[path][:], out[path][:])
+    _assert_crops(str(small), model)
+
+
+def test_memmap_slabs_are_whole_planes_within_budget(tmp_path):
+    from napari_crop_tool.cropping.file_writers import NpyCropWriter
+
+    writer = NpyCropWriter(tmp_path / "crops.npy")
+    assert writer.plan_chunks((3, 40, 60, 70), np.uint16, 60 * 70 * 2 * 5) == (
+        1, 5, 60, 70)
+    assert writer.plan_chunks((3, 40, 60, 70), np.uint16, 1) == (1, 1, 60, 70)
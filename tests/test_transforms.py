@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("napari")
+
+from napari.layers import Image
+from scipy.spatial.transform import Rotation
+
+from napari_crop_tool.cropping.transforms import (
+    CoordinateTransform,
+    LayerTransformCache,
+)
+
+
+@pytest.fixture
+def layer():
+    pyramid = [np.zeros((16, 64, 96), dtype=np.uint8),
+               np.zeros((16, 32, 48), dtype=np.uint8),
+               np.zeros((8, 16, 24), dtype=np.uint8)]
+    return Image(
+        pyramid,
+        multiscale=True,
+        scale=(3.0, 0.5, 0.5),
+        translate=(10.0, -4.0, 7.5),
+        rotate=Rotation.from_euler("zyx", [30, 10, -20], degrees=True).as_matrix(),
+    )
+
+
+@pytest.fixture
+def points():
+    return np.random.default_rng(0).uniform(-20, 60, (50, 3))
+
+
+def test_matches_napari_on_rotated_translated_multiscale(layer, points):
+    transform = CoordinateTransform.from_layer(layer)
+
+    expected = np.array([layer.world_to_data(p) for p in points])
+    np.testing.assert_allclose(transform.world_to_data(points), expected,
+                               atol=1e-9)
+    np.testing.assert_allclose(transform.data_to_world(expected), points,
+                               atol=1e-9)
+    for level in range(1, transform.n_levels):
+        np.testing.assert_allclose(
+            transform.world_to_data(points, level),
+            expected / layer.downsample_factors[level],
+            atol=1e-9,
+        )
+
+
+def test_level_scale_and_selection(layer):
+    transform = CoordinateTransform.from_layer(layer)
+
+    np.testing.assert_allclose(transform.level_scale(0), [3.0, 0.5, 0.5])
+    np.testing.assert_allclose(transform.level_scale(2), [6.0, 2.0, 2.0])
+    assert transform.select_level(None) == 0
+    assert transform.select_level(1.0) == 0
+    assert transform.select_level((3.0, 1.0, 1.0)) == 1
+    assert transform.select_level(6.0) == 2
+    level, rest = transform.select_binned_level((1, 8, 8))
+    assert level == 1
+    np.testing.assert_array_equal(rest, (1, 4, 4))
+
+
+def test_boxes_contain_every_mapped_corner(layer):
+    transform = CoordinateTransform.from_layer(layer)
+    boxes = np.array([[[0, 4], [0, 10], [5, 20]],
+                      [[10, 30], [-5, 5], [0, 1]]], dtype=float)
+
+    mapped = transform.boxes_world_to_data(boxes, level=1)
+    for box, out in zip(boxes, mapped, strict=True):
+        for corner in np.array(np.meshgrid(*box, indexing="ij")).reshape(3, -1).T:
+            p = transform.world_to_data(corner, level=1)
+            assert np.all(p >= out[:, 0] - 1e-9) and np.all(p <= out[:, 1] + 1e-9)
+
+
+def test_cache_is_reset_when_the_layer_moves(layer, points):
+    cache = LayerTransformCache(layer)
+    first = cache.get()
+    assert cache.get() is first
+
+    layer.translate = (0.0, 0.0, 0.0)
+    moved = cache.get()
+    assert moved is not first
+    np.testing.assert_allclose(
+        moved.world_to_data(points),
+        np.array([layer.world_to_data(p) for p in points]),
+        atol=1e-9,
+    )